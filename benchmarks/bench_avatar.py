@@ -0,0 +1,90 @@
+"""
+Microbenchmark do processamento de avatares (redimensionamento + máscara circular)
+
+Compara a implementação anterior (máscara 3x recriada a cada chamada, ImageOps.fit
+e putalpha duas vezes) com process_avatar, e confere que o resultado é idêntico.
+
+Uso:
+    python -m benchmarks.bench_avatar [--iterations 2000] [--source 128]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageDraw, ImageOps
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.core.img_edit import process_avatar  # noqa: E402
+
+# (largura, altura, retangular) usados pelo bot
+CASES = [(111, 135, True), (111, 135, False), (128, 128, False)]
+
+
+def legacy_process_avatar(avatar: Image.Image, x: int = -1, y: int = -1, rect: bool = False) -> Image.Image:
+    """Implementação anterior de get_avatar (após o download), para comparação"""
+    if x >= 0 and y >= 0:
+        avatar = avatar.resize((x, y), Image.Resampling.LANCZOS)
+    
+    if not rect:
+        big_avatar = (avatar.size[0] * 3, avatar.size[1] * 3)
+        mascara = Image.new('L', big_avatar, 0)
+        trim = ImageDraw.Draw(mascara)
+        trim.ellipse((0, 0) + big_avatar, fill=255)
+        mascara = mascara.resize(avatar.size, Image.Resampling.LANCZOS)
+        avatar.putalpha(mascara)
+        exit_avatar = ImageOps.fit(avatar, mascara.size, centering=(0.5, 0.5))
+        exit_avatar.putalpha(mascara)
+        avatar = exit_avatar
+    
+    return avatar
+
+
+def _source(size: int) -> Image.Image:
+    """Avatar sintético com gradiente (evita compressão/atalhos triviais)"""
+    gradient = Image.linear_gradient('L').resize((size, size))
+    return Image.merge('RGBA', (gradient, gradient.rotate(90), gradient.rotate(180), Image.new('L', (size, size), 255)))
+
+
+def bench(func, source: Image.Image, case, iterations: int) -> dict:
+    """Mede func sobre cópias do avatar de origem"""
+    x, y, rect = case
+    samples = []
+    for _ in range(iterations):
+        avatar = source.copy()
+        start = time.perf_counter()
+        func(avatar, x, y, rect)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'p50_us': statistics.median(samples),
+        'p99_us': samples[int(len(samples) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--source', type=int, default=128, help="Tamanho do avatar baixado (px)")
+    args = parser.parse_args()
+    
+    source = _source(args.source)
+    print(f"Avatar de origem {args.source}x{args.source}, {args.iterations} iterações")
+    for case in CASES:
+        x, y, rect = case
+        legacy = legacy_process_avatar(source.copy(), x, y, rect)
+        current = process_avatar(source.copy(), x, y, rect)
+        identical = legacy.size == current.size and ImageChops.difference(legacy, current).getbbox() is None
+        
+        label = f"{x}x{y} {'retângulo' if rect else 'círculo'}"
+        for name, func in (("legacy", legacy_process_avatar), ("atual", process_avatar)):
+            result = bench(func, source, case, args.iterations)
+            print(f"{label:>16} {name:>6}: p50 {result['p50_us']:.0f} µs | p99 {result['p99_us']:.0f} µs")
+        print(f"{label:>16} resultado idêntico: {'sim' if identical else 'NÃO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark da imagem de rank e verificação contra imagens de referência (golden)
+
+Renderiza cards de membros sintéticos, com o download de avatar substituído
+por um avatar gerado localmente, e mede cada etapa:
+    assets  - carga e decodificação dos assets do disco (a frio)
+    avatar  - decodificação e redimensionamento do avatar (decode_avatar)
+    layers  - cópia do background e colagem de estrelas, avatar e patente
+    text    - desenho dos textos
+    encode  - codificação (PNG/WebP)
+
+Depois compara, pixel a pixel, os cards gerados com benchmarks/golden/. Qualquer
+otimização que mude a aparência do card faz a verificação falhar (exit 1).
+
+Uso:
+    python -m benchmarks.bench_rank [--iterations 200] [--format png|webp]
+    python -m benchmarks.bench_rank --update   # regrava as imagens de referência
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageChops
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.core.img_edit import decode_avatar  # noqa: E402
+from bot.core.rank_assets import RankAssets, rank_assets  # noqa: E402
+from bot.core.rank_card import AVATAR_SIZE, compose_rank_card, draw_texts, encode_image, paste_layers  # noqa: E402
+
+GOLDEN_PATH = Path(__file__).parent / "golden"
+
+# Membros sintéticos: (arquivo golden, nome, user_id, level, conquistas, posição, admin)
+MEMBERS = [
+    ("player_basico", "JOGADOR", 101, 1, 0, None, False),
+    ("staff_top", "ADMINISTRADOR", 202, 30, 25, 1, True),
+    ("nome_longo", "NOME DE USUARIO BEM LONGO", 303, 17, 9, 1234, False),
+]
+
+
+def _avatar_bytes(seed: int) -> bytes:
+    """Avatar sintético 128x128 em PNG, como viria do CDN"""
+    gradient = Image.linear_gradient('L').resize((128, 128)).rotate(seed * 37)
+    avatar = Image.merge('RGBA', (gradient, gradient.rotate(90), gradient.rotate(180), Image.new('L', (128, 128), 255)))
+    output = BytesIO()
+    avatar.save(output, format='PNG')
+    return output.getvalue()
+
+
+def _card_inputs(member):
+    """Mesmo mapeamento de dados do cog (_generate_rank_image)"""
+    _, name, user_id, level, achievements, position, admin = member
+    return {
+        'background_name': f"background_{user_id % 9 + 1}",
+        'star': min(achievements, 25),
+        'patent': min(max(1, level), 30),
+        'position_text': str(position) if position else "?",
+        'title': "STAFF" if admin else "PLAYER",
+        'name': name,
+    }
+
+
+def _percentiles(samples):
+    """Retorna (p50, p99) das amostras"""
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.99) - 1)]
+
+
+def render_stages(member, avatar_data: bytes, encode_options: dict, timings: dict) -> bytes:
+    """Renderiza um card medindo cada etapa (ms) em timings"""
+    inputs = _card_inputs(member)
+    
+    start = time.perf_counter()
+    avatar = decode_avatar(avatar_data, *AVATAR_SIZE, True)
+    timings['avatar'].append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    image = paste_layers(inputs['background_name'], inputs['star'], avatar, inputs['patent'])
+    timings['layers'].append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    draw_texts(image, inputs['patent'], inputs['position_text'], inputs['title'], inputs['name'])
+    timings['text'].append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    data = encode_image(image, **encode_options)
+    timings['encode'].append((time.perf_counter() - start) * 1000)
+    return data
+
+
+def bench(iterations: int, encode_options: dict):
+    """Mede as etapas, o pico de memória e o tamanho das imagens"""
+    timings = {'assets': [], 'avatar': [], 'layers': [], 'text': [], 'encode': []}
+    
+    for _ in range(5):
+        start = time.perf_counter()
+        RankAssets().load()
+        timings['assets'].append((time.perf_counter() - start) * 1000)
+    rank_assets.load()
+    
+    avatars = [_avatar_bytes(i) for i in range(len(MEMBERS))]
+    sizes = []
+    tracemalloc.start()
+    for i in range(iterations):
+        idx = i % len(MEMBERS)
+        sizes.append(len(render_stages(MEMBERS[idx], avatars[idx], encode_options, timings)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    print(f"{iterations} cards, formato {encode_options['image_format']}")
+    for stage, samples in timings.items():
+        p50, p99 = _percentiles(samples)
+        print(f"{stage:>7}: p50 {p50:.2f} ms | p99 {p99:.2f} ms")
+    total = [sum(stage) for stage in zip(timings['avatar'], timings['layers'], timings['text'], timings['encode'])]
+    p50, p99 = _percentiles(total)
+    print(f"{'total':>7}: p50 {p50:.2f} ms | p99 {p99:.2f} ms (sem assets)")
+    print(f"pico de memória durante as renderizações: {peak / 1024 / 1024:.1f} MB")
+    print(f"tamanho da imagem: média {statistics.mean(sizes) / 1024:.1f} KB, máx {max(sizes) / 1024:.1f} KB")
+
+
+def check_golden(update: bool) -> bool:
+    """Compara os cards com as imagens de referência (ou as regrava com update)"""
+    GOLDEN_PATH.mkdir(exist_ok=True)
+    ok = True
+    for idx, member in enumerate(MEMBERS):
+        avatar = decode_avatar(_avatar_bytes(idx), *AVATAR_SIZE, True)
+        image = compose_rank_card(avatar=avatar, **_card_inputs(member))
+        golden_file = GOLDEN_PATH / f"{member[0]}.png"
+        
+        if update:
+            image.save(golden_file, format='PNG', optimize=True)
+            print(f"golden atualizado: {golden_file.name}")
+            continue
+        
+        if not golden_file.exists():
+            print(f"golden ausente: {golden_file.name} (rode com --update)")
+            ok = False
+            continue
+        
+        with Image.open(golden_file) as golden:
+            golden = golden.convert('RGBA')
+        if golden.size != image.size:
+            print(f"DIFERENTE: {golden_file.name} (tamanho {image.size} != {golden.size})")
+            ok = False
+            continue
+        
+        bbox = ImageChops.difference(image, golden).getbbox()
+        if bbox is None:
+            print(f"idêntico: {golden_file.name}")
+        else:
+            diff = ImageChops.difference(image, golden).convert('L')
+            changed = sum(1 for value in diff.getdata() if value)
+            print(f"DIFERENTE: {golden_file.name} ({changed} pixels na região {bbox})")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--format', choices=('png', 'webp'), default='png')
+    parser.add_argument('--compress-level', type=int, default=3)
+    parser.add_argument('--quality', type=int, default=90)
+    parser.add_argument('--update', action='store_true', help="Regrava as imagens de referência")
+    args = parser.parse_args()
+    
+    if not args.update:
+        bench(args.iterations, {
+            'image_format': args.format,
+            'compress_level': args.compress_level,
+            'optimize': False,
+            'quality': args.quality,
+        })
+        print()
+    
+    if not check_golden(args.update):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Microbenchmark do RateLimiter com 100k chaves ativas
+
+Uso:
+    python -m benchmarks.bench_rate_limiter [--keys 100000] [--calls 500000]
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.core.rate_limiter import RateLimiter  # noqa: E402
+
+COMMANDS = ["bosses", "siege", "olympiad", "heroes", "clan", "auction", "rank", "top_rich"]
+
+
+class LegacyRateLimiter:
+    """Implementação anterior (lista de timestamps por chave), para comparação"""
+    
+    def __init__(self, max_requests: int = 10, window_seconds: int = 60):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self._requests = defaultdict(lambda: defaultdict(list))
+    
+    def is_allowed(self, user_id, command):
+        now = time.time()
+        user_requests = self._requests[user_id][command]
+        user_requests[:] = [ts for ts in user_requests if now - ts < self.window_seconds]
+        if len(user_requests) >= self.max_requests:
+            return False
+        user_requests.append(now)
+        return True
+    
+    def get_reset_time(self, user_id, command):
+        user_requests = self._requests[user_id][command]
+        if not user_requests:
+            return None
+        return min(user_requests) + self.window_seconds
+
+
+def _keys(count: int):
+    """Gera pares (usuário, comando) distintos"""
+    return [(user_id // len(COMMANDS), COMMANDS[user_id % len(COMMANDS)]) for user_id in range(count)]
+
+
+def bench(limiter_cls, keys, calls: int) -> dict:
+    """Mede is_allowed/get_reset_time sobre um conjunto de chaves já ativas"""
+    tracemalloc.start()
+    limiter = limiter_cls(max_requests=10, window_seconds=60)
+    
+    # Aquece: cada chave com algumas requisições na janela
+    for user_id, command in keys:
+        for _ in range(5):
+            limiter.is_allowed(user_id, command)
+    _, warm_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    rng = random.Random(42)
+    sample = [keys[rng.randrange(len(keys))] for _ in range(calls)]
+    
+    start = time.perf_counter()
+    for user_id, command in sample:
+        limiter.is_allowed(user_id, command)
+    allowed_elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for user_id, command in sample:
+        limiter.get_reset_time(user_id, command)
+    reset_elapsed = time.perf_counter() - start
+    
+    return {
+        'is_allowed_ns': allowed_elapsed / calls * 1e9,
+        'get_reset_time_ns': reset_elapsed / calls * 1e9,
+        'memory_mb': warm_peak / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=100_000)
+    parser.add_argument('--calls', type=int, default=500_000)
+    args = parser.parse_args()
+    
+    keys = _keys(args.keys)
+    print(f"{args.keys} chaves ativas, {args.calls} chamadas")
+    for name, cls in (("legacy", LegacyRateLimiter), ("gcra", RateLimiter)):
+        result = bench(cls, keys, args.calls)
+        print(
+            f"{name:>7}: is_allowed {result['is_allowed_ns']:.0f} ns/op | "
+            f"get_reset_time {result['get_reset_time_ns']:.0f} ns/op | "
+            f"memória {result['memory_mb']:.1f} MB"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -53,7 +53,7 @@ class HelpCommand(commands.Cog):
                 name="📊 Servidor",
                 value="`/online` - Jogadores online\n"
                       "`/search` - Buscar personagem\n"
-                      "`/top-pvp`, `/top-pk`, `/top-level` - Rankings",
+                      "`/top-pvp`, `/top-pk`, `/top-level`, `/top-card` - Rankings",
                 inline=True
             )
             
@@ -97,7 +97,7 @@ class HelpCommand(commands.Cog):
                 name="🔐 Autenticação [PAINEL]",
                 value="`/login` - Fazer login\n"
                       "`/logout` - Fazer logout\n"
-                      "`/account`, `/dashboard`, `/mystats` - Dados pessoais",
+                      "`/account`, `/dashboard`, `/mystats`, `/me` - Dados pessoais",
                 inline=True
             )
             
@@ -174,6 +174,11 @@ class HelpCommand(commands.Cog):
                 value="Mostra ranking de nível (padrão: 10, máximo: 20).",
                 inline=False
             )
+            embed.add_field(
+                name="`/top-card <ranking> [limite]`",
+                value="Mostra o top de nível, PvP ou Olimpíada em uma imagem (padrão: 5, máximo: 10).",
+                inline=False
+            )
         
         elif category == "bosses":
             embed = discord.Embed(
@@ -299,6 +304,11 @@ class HelpCommand(commands.Cog):
                 value="[PAINEL] Mostra suas estatísticas detalhadas (requer login).",
                 inline=False
             )
+            embed.add_field(
+                name="`/me`",
+                value="[PAINEL] Mostra perfil, dashboard e estatísticas em um só embed (requer login).",
+                inline=False
+            )
             embed.add_field(
                 name="`/profile`",
                 value="[BOT] Mostra perfil de um usuário do Discord (não requer login).",
@@ -350,6 +360,12 @@ class HelpCommand(commands.Cog):
                       "- Notificações de Saída de Membros",
                 inline=False
             )
+            embed.add_field(
+                name="`/config-set-rate-limit`",
+                value="Define quantas vezes cada usuário pode usar um comando por janela de tempo neste servidor.\n\n"
+                      "Use `0` usos para voltar ao limite padrão.",
+                inline=False
+            )
         
         else:
             embed = discord.Embed(
@@ -2,13 +2,27 @@
 Cog para sistema de notificações automáticas
 """
 
+import asyncio
 import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
 import discord
 from discord.ext import commands
 from datetime import datetime
+from bot.core.boss_tracker import BossTracker, boss_name
+from bot.core.config import Config
+from bot.core.metrics import metrics
+from bot.core.siege_schedule import SiegeEvent, SiegeSchedule
 
 logger = logging.getLogger(__name__)
 
+# Métodos do SiteClient de cada tipo de boss
+BOSS_FETCHERS = {
+    'grandboss': 'get_grandboss_status',
+    'raidboss': 'get_raidboss_status',
+}
+
 
 class Notifications(commands.Cog):
     """Sistema de notificações automáticas"""
@@ -16,11 +30,40 @@ class Notifications(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = bot.db
+        self.boss_tracker = BossTracker(
+            idle_interval=Config.BOSS_POLL_INTERVAL,
+            window_interval=Config.BOSS_WINDOW_POLL_INTERVAL,
+            window_before=Config.BOSS_WINDOW_BEFORE,
+            window_after=Config.BOSS_WINDOW_AFTER,
+        )
+        # Servidores inscritos por tipo: {setting: (servers_version, expira_em, {domínio: servidores})}
+        self._subscriber_cache: Dict[str, Tuple[int, float, Dict[str, List[Tuple[int, Dict]]]]] = {}
+        # Próxima consulta de cada tipo de boss por domínio: {(domínio, tipo): timestamp}
+        self._boss_next_poll: Dict[Tuple[str, str], float] = {}
+        self.siege_schedule = SiegeSchedule(Config.SIEGE_NOTIFY_OFFSETS)
+        # Domínios cuja agenda de cercos já foi carregada
+        self._siege_domains: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+    
+    async def cog_load(self):
+        """Inicia os pollers de notificações"""
+        if Config.BOSS_POLL_INTERVAL > 0:
+            self._tasks.append(asyncio.create_task(self._boss_poll_loop()))
+        if Config.SIEGE_REFRESH_INTERVAL > 0:
+            self._tasks.append(asyncio.create_task(self._siege_loop()))
     
-    async def send_notification(self, guild_id: int, embed: discord.Embed, notification_type: str):
-        """Envia notificação se estiver habilitada"""
+    async def cog_unload(self):
+        """Para os pollers de notificações"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+    
+    async def send_notification(self, guild_id: int, embed: discord.Embed, notification_type: str,
+                                config: Optional[Dict] = None):
+        """Envia notificação se estiver habilitada (config evita reler o banco)"""
         try:
-            config = await self.db.get_server_config(str(guild_id))
+            if config is None:
+                config = await self.db.get_server_config(str(guild_id))
             
             # Verificar se notificação está habilitada
             if not config.get(f'{notification_type}_notifications', False):
@@ -94,10 +137,204 @@ class Notifications(commands.Cog):
         
         await self.send_notification(member.guild.id, embed, 'member_leave')
     
+    # ==================== POLLERS ====================
+    
+    async def _subscribers(self, setting: str) -> Dict[str, List[Tuple[int, Dict]]]:
+        """
+        Servidores com a notificação habilitada, agrupados por domínio
+        
+        O resultado fica em cache por NOTIFY_SUBSCRIBERS_TTL segundos, para que os
+        pollers não varram a coleção de servidores a cada ciclo; alterações feitas
+        por este processo (db.servers_version) invalidam o cache na hora.
+        """
+        cached = self._subscriber_cache.get(setting)
+        now = time.time()
+        if cached and cached[0] == self.db.servers_version and cached[1] > now:
+            return cached[2]
+        
+        version = self.db.servers_version
+        by_domain = defaultdict(list)
+        for server in await self.db.list_servers():
+            config = server.get('config') or {}
+            if config.get(setting, False):
+                by_domain[server['site_domain']].append((int(server['discord_guild_id']), config))
+        self._subscriber_cache[setting] = (version, now + Config.NOTIFY_SUBSCRIBERS_TTL, by_domain)
+        return by_domain
+    
+    async def _boss_poll_loop(self):
+        """Consulta os bosses de cada domínio no horário previsto por domínio"""
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            try:
+                await self.poll_bosses()
+            except Exception as e:
+                logger.error(f"Erro no poller de bosses: {e}", exc_info=True)
+            
+            # Dorme até o próximo domínio a consultar (novos inscritos entram no ciclo seguinte)
+            wake_at = min(self._boss_next_poll.values(), default=time.time() + Config.BOSS_POLL_INTERVAL)
+            await asyncio.sleep(max(1.0, min(wake_at - time.time(), Config.BOSS_POLL_INTERVAL)))
+    
+    async def poll_bosses(self):
+        """
+        Consulta grand/raid bosses dos domínios com consulta vencida e notifica as transições
+        
+        Cada domínio é consultado uma única vez por ciclo, independente de
+        quantos servidores o usam; spawns e mortes são enviados a todos os
+        servidores do domínio com notificações de bosses habilitadas. Grand
+        bosses seguem as janelas de respawn (BossTracker.next_poll_at); raid
+        bosses, que não definem janelas, são consultados a cada BOSS_POLL_INTERVAL.
+        """
+        subscribers = await self._subscribers('boss_notifications')
+        
+        # Domínios sem inscritos deixam de ser acompanhados
+        for domain in self.boss_tracker.domains():
+            if domain not in subscribers:
+                self.boss_tracker.forget(domain)
+        for key in list(self._boss_next_poll):
+            if key[0] not in subscribers:
+                del self._boss_next_poll[key]
+        
+        now = time.time()
+        polls = []
+        for domain, guilds in subscribers.items():
+            kinds = [kind for kind in BOSS_FETCHERS if self._boss_next_poll.get((domain, kind), 0) <= now]
+            if kinds:
+                polls.append(self._poll_domain_bosses(domain, guilds, kinds))
+        await asyncio.gather(*polls)
+    
+    def _schedule_boss_poll(self, domain: str, kind: str):
+        """Agenda a próxima consulta de um tipo de boss do domínio"""
+        now = time.time()
+        if kind == 'grandboss':
+            self._boss_next_poll[(domain, kind)] = self.boss_tracker.next_poll_at(domain, now)
+        else:
+            self._boss_next_poll[(domain, kind)] = now + Config.BOSS_POLL_INTERVAL
+    
+    async def _poll_domain_bosses(self, domain: str, guilds: List[Tuple[int, Dict]], kinds: List[str]):
+        """Consulta os tipos de boss vencidos de um domínio e repassa as transições aos servidores"""
+        in_window = self.boss_tracker.in_window(domain, time.time())
+        for kind in kinds:
+            metrics.incr(
+                'notifications.boss_poll', kind=kind,
+                mode='window' if kind == 'grandboss' and in_window else 'idle'
+            )
+        try:
+            client = await self.bot.get_site_client(domain)
+            results = await asyncio.gather(*(getattr(client, BOSS_FETCHERS[kind])() for kind in kinds))
+        except Exception as e:
+            logger.warning(f"Erro ao consultar bosses de {domain}: {e}")
+            results = [None] * len(kinds)
+        
+        spawned, died = [], []
+        for kind, bosses in zip(kinds, results):
+            # Falha na consulta: mantém o estado anterior
+            if isinstance(bosses, list):
+                kind_spawned, kind_died = self.boss_tracker.update(domain, kind, bosses)
+                spawned += kind_spawned
+                died += kind_died
+            self._schedule_boss_poll(domain, kind)
+        
+        if not spawned and not died:
+            return
+        
+        logger.info(f"Bosses em {domain}: {len(spawned)} spawn(s), {len(died)} morte(s)")
+        metrics.incr('notifications.boss', len(spawned), event='spawn')
+        metrics.incr('notifications.boss', len(died), event='death')
+        sends = []
+        for guild_id, config in guilds:
+            for boss in spawned:
+                sends.append(self.notify_boss_spawn(
+                    guild_id, boss_name(boss), boss.get('location') or 'N/A', config=config
+                ))
+            for boss in died:
+                sends.append(self.notify_boss_death(
+                    guild_id, boss_name(boss), boss.get('respawn_time'), config=config
+                ))
+        await asyncio.gather(*sends)
+    
+    async def _siege_loop(self):
+        """
+        Dispara os avisos de cerco no horário, sem consultar a API a cada ciclo
+        
+        Dorme até o próximo aviso da agenda (min-heap) ou até a próxima
+        atualização da agenda, o que vier primeiro. A agenda de cada domínio é
+        recarregada a cada SIEGE_REFRESH_INTERVAL segundos; domínios inscritos
+        depois disso são carregados em até NOTIFY_SUBSCRIBERS_TTL segundos.
+        """
+        await self.bot.wait_until_ready()
+        next_refresh = 0.0
+        while not self.bot.is_closed():
+            try:
+                now = time.time()
+                due = self.siege_schedule.pop_due(now)
+                if due:
+                    await self._send_siege_events(due)
+                if now >= next_refresh:
+                    await self.refresh_sieges(now)
+                    next_refresh = now + Config.SIEGE_REFRESH_INTERVAL
+                else:
+                    await self.refresh_sieges(now, only_new=True)
+            except Exception as e:
+                logger.error(f"Erro no agendador de cercos: {e}", exc_info=True)
+                next_refresh = max(next_refresh, time.time() + 60)
+            
+            # Acorda periodicamente para carregar domínios recém-inscritos
+            wake_at = min(next_refresh, time.time() + Config.NOTIFY_SUBSCRIBERS_TTL)
+            next_event = self.siege_schedule.next_at()
+            if next_event is not None:
+                wake_at = min(wake_at, next_event)
+            await asyncio.sleep(max(1.0, wake_at - time.time()))
+    
+    async def refresh_sieges(self, now: float, only_new: bool = False):
+        """
+        Recarrega a agenda de cercos dos domínios com notificações habilitadas
+        
+        Args:
+            now: Horário atual (timestamp)
+            only_new: Carrega apenas domínios que ainda não têm agenda
+        """
+        subscribers = await self._subscribers('siege_notifications')
+        for domain in self._siege_domains.union(self.siege_schedule.domains()):
+            if domain not in subscribers:
+                self.siege_schedule.forget(domain)
+                self._siege_domains.discard(domain)
+        
+        domains = [domain for domain in subscribers if not only_new or domain not in self._siege_domains]
+        
+        async def refresh(domain: str):
+            try:
+                client = await self.bot.get_site_client(domain)
+                sieges = await client.get_siege_status()
+            except Exception as e:
+                logger.warning(f"Erro ao consultar cercos de {domain}: {e}")
+                return
+            # Falha na consulta: mantém a agenda anterior
+            if not isinstance(sieges, list):
+                return
+            scheduled = self.siege_schedule.replace(domain, sieges, now)
+            self._siege_domains.add(domain)
+            logger.info(f"Cercos de {domain}: {scheduled} aviso(s) agendado(s)")
+        
+        await asyncio.gather(*(refresh(domain) for domain in domains))
+    
+    async def _send_siege_events(self, events: List[SiegeEvent]):
+        """Envia os avisos de cerco aos servidores inscritos em cada domínio"""
+        subscribers = await self._subscribers('siege_notifications')
+        sends = []
+        for event in events:
+            if event.offset == 0:
+                status = "O cerco começou!"
+            else:
+                status = f"O cerco começa <t:{int(event.siege_at)}:R> (<t:{int(event.siege_at)}:f>)"
+            metrics.incr('notifications.siege', offset=event.offset)
+            for guild_id, config in subscribers.get(event.domain, []):
+                sends.append(self.notify_siege(guild_id, event.castle_name, status, config=config))
+        await asyncio.gather(*sends)
+    
     # Métodos auxiliares para notificações de bosses, cercos, etc.
-    # Estes serão chamados por outros cogs quando necessário
     
-    async def notify_boss_spawn(self, guild_id: int, boss_name: str, location: str):
+    async def notify_boss_spawn(self, guild_id: int, boss_name: str, location: str,
+                                config: Optional[Dict] = None):
         """Notifica sobre spawn de boss"""
         embed = discord.Embed(
             title="🐉 Boss Spawnou!",
@@ -106,9 +343,27 @@ class Notifications(commands.Cog):
             timestamp=datetime.utcnow()
         )
         embed.add_field(name="Localização", value=location, inline=True)
-        await self.send_notification(guild_id, embed, 'boss')
+        await self.send_notification(guild_id, embed, 'boss', config)
+    
+    async def notify_boss_death(self, guild_id: int, boss_name: str, respawn_time: Optional[str] = None,
+                                config: Optional[Dict] = None):
+        """Notifica sobre morte de boss"""
+        embed = discord.Embed(
+            title="💀 Boss Morreu",
+            description=f"**{boss_name}** foi derrotado!",
+            color=discord.Color.dark_grey(),
+            timestamp=datetime.utcnow()
+        )
+        if respawn_time and respawn_time != '-':
+            try:
+                respawn = datetime.fromisoformat(respawn_time.replace('Z', '+00:00'))
+                embed.add_field(name="Respawn", value=f"<t:{int(respawn.timestamp())}:R>", inline=True)
+            except ValueError:
+                embed.add_field(name="Respawn", value=respawn_time, inline=True)
+        await self.send_notification(guild_id, embed, 'boss', config)
     
-    async def notify_siege(self, guild_id: int, castle_name: str, status: str):
+    async def notify_siege(self, guild_id: int, castle_name: str, status: str,
+                           config: Optional[Dict] = None):
         """Notifica sobre cerco"""
         embed = discord.Embed(
             title="🏰 Cerco",
@@ -116,7 +371,7 @@ class Notifications(commands.Cog):
             color=discord.Color.purple(),
             timestamp=datetime.utcnow()
         )
-        await self.send_notification(guild_id, embed, 'siege')
+        await self.send_notification(guild_id, embed, 'siege', config)
     
     async def notify_olympiad(self, guild_id: int, message: str):
         """Notifica sobre olimpíada"""
@@ -3,15 +3,15 @@ Cog com comandos para jogadores interagirem com a API do site
 Inclui bosses, olimpíada, cercos, clãs, leilão e comandos autenticados
 """
 
+import asyncio
 import logging
-import time
 import discord
 from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
-from typing import Optional
-from bot.core.rate_limiter import rate_limiter
-from bot.core.auth_manager import AuthManager
+from typing import Any, Optional
+from bot.core.rate_limiter import check_rate_limit
+from bot.core.snapshots import stale_notice
 
 logger = logging.getLogger(__name__)
 
@@ -75,7 +75,7 @@ class PlayerCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = bot.db
-        self.auth_manager = AuthManager(bot.db)
+        self.auth_manager = bot.auth_manager
     
     async def _get_site_client(self, guild_id: int):
         """Obtém o cliente do site para o servidor"""
@@ -87,18 +87,6 @@ class PlayerCommands(commands.Cog):
         client = await self.bot.get_site_client(server_data['site_domain'])
         return client, server_data['site_domain']
     
-    async def _check_rate_limit(self, interaction: discord.Interaction, command: str) -> bool:
-        """Verifica rate limit e responde se excedido"""
-        if not rate_limiter.is_allowed(interaction.user.id, command):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, command)
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
-            return False
-        return True
-    
     def _sanitize_input(self, text: str, max_length: int = 50) -> str:
         """Sanitiza input do usuário"""
         # Remove caracteres perigosos e limita tamanho
@@ -122,14 +110,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.command(name="bosses", description="[PAINEL] Mostra status dos Grand Bosses")
     async def bosses(self, interaction: discord.Interaction):
         """Mostra status dos Grand Bosses"""
-        if not await self._check_rate_limit(interaction, "bosses"):
-            import time
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "bosses")
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "bosses"):
             return
         
         await interaction.response.defer()
@@ -144,7 +125,9 @@ class PlayerCommands(commands.Cog):
                 )
                 return
             
-            data = await client.get_grandboss_status()
+            data, stale = await self.bot.snapshots.fetch(
+                client, 'grandboss-status', client.get_grandboss_status
+            )
             
             if not data or not isinstance(data, list):
                 await interaction.followup.send(
@@ -176,8 +159,16 @@ class PlayerCommands(commands.Cog):
                     inline=True
                 )
             
+            footer = []
             if len(data) > 10:
-                embed.set_footer(text=f"Mostrando 10 de {len(data)} bosses")
+                footer.append(f"Mostrando 10 de {len(data)} bosses")
+            
+            if stale:
+                embed.timestamp = stale.as_of
+                footer.append(stale_notice(stale))
+            
+            if footer:
+                embed.set_footer(text=" | ".join(footer))
             
             await interaction.followup.send(embed=embed)
             
@@ -193,7 +184,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.autocomplete(jewels=boss_jewel_autocomplete)
     async def boss_jewel(self, interaction: discord.Interaction, jewels: str):
         """Busca localização de Boss Jewels"""
-        if not await self._check_rate_limit(interaction, "boss_jewel"):
+        if not await check_rate_limit(interaction, "boss_jewel"):
             return
         
         await interaction.response.defer()
@@ -284,14 +275,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.describe(limit="Número de jogadores (padrão: 10, máximo: 20)")
     async def olympiad(self, interaction: discord.Interaction, limit: int = 10):
         """Mostra ranking da Olimpíada"""
-        if not await self._check_rate_limit(interaction, "olympiad"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "olympiad")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "olympiad"):
             return
         
         # Valida limite
@@ -309,7 +293,9 @@ class PlayerCommands(commands.Cog):
                 )
                 return
             
-            data = await client.get_olympiad_ranking()
+            data, stale = await self.bot.snapshots.fetch(
+                client, 'olympiad-ranking', client.get_olympiad_ranking
+            )
             
             if not data or not isinstance(data, list):
                 await interaction.followup.send(
@@ -336,6 +322,10 @@ class PlayerCommands(commands.Cog):
                     inline=False
                 )
             
+            if stale:
+                embed.timestamp = stale.as_of
+                embed.set_footer(text=stale_notice(stale))
+            
             await interaction.followup.send(embed=embed)
             
         except Exception as e:
@@ -348,14 +338,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.command(name="heroes", description="[PAINEL] Mostra heróis atuais da Olimpíada")
     async def heroes(self, interaction: discord.Interaction):
         """Mostra heróis atuais da Olimpíada"""
-        if not await self._check_rate_limit(interaction, "heroes"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "heroes")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "heroes"):
             return
         
         await interaction.response.defer()
@@ -411,14 +394,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.command(name="siege", description="[PAINEL] Mostra status dos cercos")
     async def siege(self, interaction: discord.Interaction):
         """Mostra status dos cercos"""
-        if not await self._check_rate_limit(interaction, "siege"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "siege")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "siege"):
             return
         
         await interaction.response.defer()
@@ -433,7 +409,9 @@ class PlayerCommands(commands.Cog):
                 )
                 return
             
-            data = await client.get_siege_status()
+            data, stale = await self.bot.snapshots.fetch(
+                client, 'siege', client.get_siege_status
+            )
             
             if not data or not isinstance(data, list):
                 await interaction.followup.send(
@@ -460,6 +438,10 @@ class PlayerCommands(commands.Cog):
                     inline=True
                 )
             
+            if stale:
+                embed.timestamp = stale.as_of
+                embed.set_footer(text=stale_notice(stale))
+            
             await interaction.followup.send(embed=embed)
             
         except Exception as e:
@@ -484,14 +466,7 @@ class PlayerCommands(commands.Cog):
     ])
     async def siege_participants(self, interaction: discord.Interaction, castle: int):
         """Mostra participantes de um cerco"""
-        if not await self._check_rate_limit(interaction, "siege_participants"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "siege_participants")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "siege_participants"):
             return
         
         castle_id = castle
@@ -553,14 +528,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.describe(clan_name="Nome do clã")
     async def clan(self, interaction: discord.Interaction, clan_name: str):
         """Busca informações de um clã"""
-        if not await self._check_rate_limit(interaction, "clan"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "clan")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "clan"):
             return
         
         # Sanitiza input
@@ -622,14 +590,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.describe(limit="Número de itens (padrão: 10, máximo: 20)")
     async def auction(self, interaction: discord.Interaction, limit: int = 10):
         """Mostra itens do leilão"""
-        if not await self._check_rate_limit(interaction, "auction"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "auction")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "auction"):
             return
         
         # Valida limite
@@ -687,14 +648,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.describe(item_name="Nome do item")
     async def item_search(self, interaction: discord.Interaction, item_name: str):
         """Busca um item"""
-        if not await self._check_rate_limit(interaction, "item_search"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "item_search")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "item_search"):
             return
         
         # Sanitiza input
@@ -764,14 +718,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.describe(limit="Número de jogadores (padrão: 10, máximo: 20)")
     async def top_rich(self, interaction: discord.Interaction, limit: int = 10):
         """Mostra ranking de riqueza"""
-        if not await self._check_rate_limit(interaction, "top_rich"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "top_rich")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "top_rich"):
             return
         
         limit = max(1, min(20, limit))
@@ -826,14 +773,7 @@ class PlayerCommands(commands.Cog):
     @app_commands.describe(limit="Número de jogadores (padrão: 10, máximo: 20)")
     async def top_online(self, interaction: discord.Interaction, limit: int = 10):
         """Mostra ranking de tempo online"""
-        if not await self._check_rate_limit(interaction, "top_online"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "top_online")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "top_online"):
             return
         
         limit = max(1, min(20, limit))
@@ -930,7 +870,7 @@ class PlayerCommands(commands.Cog):
             )
             
             if result and result.get('success'):
-                user_info = self.auth_manager.get_user_info(interaction.user.id)
+                user_info = self.auth_manager.get_user_info(interaction.user.id, domain)
                 username_display = user_info.get('username', username) if user_info else username
                 await interaction.followup.send(
                     f"✅ Login realizado com sucesso!\n"
@@ -956,14 +896,19 @@ class PlayerCommands(commands.Cog):
         """Faz logout do site"""
         await interaction.response.defer(ephemeral=True)
         
-        if not self.auth_manager.is_authenticated(interaction.user.id):
+        _, domain = await self._get_site_client(interaction.guild.id)
+        
+        if domain:
+            await self.auth_manager.load_session(interaction.user.id, domain)
+        
+        if not self.auth_manager.is_authenticated(interaction.user.id, domain):
             await interaction.followup.send(
                 "❌ Você não está autenticado.",
                 ephemeral=True
             )
             return
         
-        self.auth_manager.logout(interaction.user.id)
+        await self.auth_manager.logout(interaction.user.id, domain)
         await interaction.followup.send(
             "✅ Logout realizado com sucesso!",
             ephemeral=True
@@ -972,26 +917,11 @@ class PlayerCommands(commands.Cog):
     @app_commands.command(name="account", description="[PAINEL] Mostra seu perfil no site (requer login)")
     async def account(self, interaction: discord.Interaction):
         """Mostra perfil do usuário"""
-        if not await self._check_rate_limit(interaction, "profile"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "profile")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "profile"):
             return
         
         await interaction.response.defer(ephemeral=True)
         
-        token = self.auth_manager.get_token(interaction.user.id)
-        if not token:
-            await interaction.followup.send(
-                "❌ Você precisa fazer login primeiro. Use `/login`.",
-                ephemeral=True
-            )
-            return
-        
         try:
             client, domain = await self._get_site_client(interaction.guild.id)
             
@@ -1002,7 +932,15 @@ class PlayerCommands(commands.Cog):
                 )
                 return
             
-            data = await client.get_user_profile(token)
+            token = await self.auth_manager.get_valid_token(interaction.user.id, domain)
+            if not token:
+                await interaction.followup.send(
+                    "❌ Você precisa fazer login primeiro. Use `/login`.",
+                    ephemeral=True
+                )
+                return
+            
+            data = await self.auth_manager.fetch_user_data(interaction.user.id, domain, 'profile', token)
             
             if not data:
                 await interaction.followup.send(
@@ -1040,26 +978,11 @@ class PlayerCommands(commands.Cog):
     @app_commands.command(name="dashboard", description="[PAINEL] Mostra seu dashboard (requer login)")
     async def dashboard(self, interaction: discord.Interaction):
         """Mostra dashboard do usuário"""
-        if not await self._check_rate_limit(interaction, "dashboard"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "dashboard")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "dashboard"):
             return
         
         await interaction.response.defer(ephemeral=True)
         
-        token = self.auth_manager.get_token(interaction.user.id)
-        if not token:
-            await interaction.followup.send(
-                "❌ Você precisa fazer login primeiro. Use `/login`.",
-                ephemeral=True
-            )
-            return
-        
         try:
             client, domain = await self._get_site_client(interaction.guild.id)
             
@@ -1070,7 +993,15 @@ class PlayerCommands(commands.Cog):
                 )
                 return
             
-            data = await client.get_user_dashboard(token)
+            token = await self.auth_manager.get_valid_token(interaction.user.id, domain)
+            if not token:
+                await interaction.followup.send(
+                    "❌ Você precisa fazer login primeiro. Use `/login`.",
+                    ephemeral=True
+                )
+                return
+            
+            data = await self.auth_manager.fetch_user_data(interaction.user.id, domain, 'dashboard', token)
             
             if not data:
                 await interaction.followup.send(
@@ -1106,26 +1037,11 @@ class PlayerCommands(commands.Cog):
     @app_commands.command(name="mystats", description="[PAINEL] Mostra suas estatísticas (requer login)")
     async def mystats(self, interaction: discord.Interaction):
         """Mostra estatísticas do usuário"""
-        if not await self._check_rate_limit(interaction, "stats"):
-            reset_time = rate_limiter.get_reset_time(interaction.user.id, "stats")
-            import time
-            reset_seconds = int(reset_time - time.time()) if reset_time else 60
-            await interaction.response.send_message(
-                f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
-                ephemeral=True
-            )
+        if not await check_rate_limit(interaction, "stats"):
             return
         
         await interaction.response.defer(ephemeral=True)
         
-        token = self.auth_manager.get_token(interaction.user.id)
-        if not token:
-            await interaction.followup.send(
-                "❌ Você precisa fazer login primeiro. Use `/login`.",
-                ephemeral=True
-            )
-            return
-        
         try:
             client, domain = await self._get_site_client(interaction.guild.id)
             
@@ -1136,7 +1052,15 @@ class PlayerCommands(commands.Cog):
                 )
                 return
             
-            data = await client.get_user_stats(token)
+            token = await self.auth_manager.get_valid_token(interaction.user.id, domain)
+            if not token:
+                await interaction.followup.send(
+                    "❌ Você precisa fazer login primeiro. Use `/login`.",
+                    ephemeral=True
+                )
+                return
+            
+            data = await self.auth_manager.fetch_user_data(interaction.user.id, domain, 'stats', token)
             
             if not data:
                 await interaction.followup.send(
@@ -1168,6 +1092,104 @@ class PlayerCommands(commands.Cog):
                 "❌ Erro ao buscar estatísticas.",
                 ephemeral=True
             )
+    
+    def _format_fields(self, data: Any, max_length: int = 1024) -> str:
+        """Formata um dict como linhas 'Chave: valor' para um campo de embed (outros tipos viram texto)"""
+        if isinstance(data, dict):
+            lines = [
+                f"**{str(key).replace('_', ' ').title()}:** {value}"
+                for key, value in data.items()
+                if value is not None
+            ]
+            text = "\n".join(lines)
+        else:
+            text = str(data)
+        text = text or "Nenhum dado disponível"
+        return text if len(text) <= max_length else text[:max_length - 3] + "..."
+    
+    @app_commands.command(name="me", description="[PAINEL] Mostra seu perfil, dashboard e estatísticas (requer login)")
+    async def me(self, interaction: discord.Interaction):
+        """Mostra perfil, dashboard e estatísticas do usuário em um único embed"""
+        if not await check_rate_limit(interaction, "me"):
+            return
+        
+        await interaction.response.defer(ephemeral=True)
+        
+        try:
+            client, domain = await self._get_site_client(interaction.guild.id)
+            
+            if not client:
+                await interaction.followup.send(
+                    "❌ Este servidor não está registrado.",
+                    ephemeral=True
+                )
+                return
+            
+            token = await self.auth_manager.get_valid_token(interaction.user.id, domain)
+            if not token:
+                await interaction.followup.send(
+                    "❌ Você precisa fazer login primeiro. Use `/login`.",
+                    ephemeral=True
+                )
+                return
+            
+            # Busca os três dados em paralelo
+            profile, dashboard, stats = await asyncio.gather(
+                self.auth_manager.fetch_user_data(interaction.user.id, domain, 'profile', token),
+                self.auth_manager.fetch_user_data(interaction.user.id, domain, 'dashboard', token),
+                self.auth_manager.fetch_user_data(interaction.user.id, domain, 'stats', token),
+                return_exceptions=True
+            )
+            
+            for result in (profile, dashboard, stats):
+                if isinstance(result, Exception):
+                    logger.warning(f"Erro em chamada autenticada do /me: {result}")
+            profile, dashboard, stats = (
+                None if isinstance(result, Exception) else result
+                for result in (profile, dashboard, stats)
+            )
+            
+            if not profile and not dashboard and not stats:
+                await interaction.followup.send(
+                    "❌ Não foi possível obter seus dados.",
+                    ephemeral=True
+                )
+                return
+            
+            embed = discord.Embed(
+                title="👤 Seus Dados",
+                color=discord.Color.blue(),
+                timestamp=discord.utils.utcnow()
+            )
+            
+            if isinstance(profile, dict) and profile:
+                embed.add_field(name="Username", value=profile.get('username', 'N/A'), inline=True)
+                embed.add_field(name="Email", value=profile.get('email', 'N/A'), inline=True)
+                date_joined = profile.get('date_joined')
+                if date_joined:
+                    embed.add_field(name="Membro desde", value=self._format_time(date_joined), inline=True)
+            else:
+                embed.add_field(name="👤 Perfil", value="Não foi possível obter o perfil.", inline=False)
+            
+            embed.add_field(
+                name="📊 Dashboard",
+                value=self._format_fields(dashboard) if dashboard else "Não foi possível obter o dashboard.",
+                inline=False
+            )
+            embed.add_field(
+                name="📈 Estatísticas",
+                value=self._format_fields(stats) if stats else "Não foi possível obter as estatísticas.",
+                inline=False
+            )
+            
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            
+        except Exception as e:
+            logger.error(f"Erro no comando me: {e}", exc_info=True)
+            await interaction.followup.send(
+                "❌ Erro ao buscar seus dados.",
+                ephemeral=True
+            )
 
 
 async def setup(bot):
@@ -2,21 +2,81 @@
 Cog para comando de rank - gera imagem similar ao Ashley Bot
 """
 
+import asyncio
+import hashlib
+import json
 import logging
 import re
+import time
 import unicodedata
-from random import choice
-from pathlib import Path
+from functools import partial
+from io import BytesIO
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
 import discord
 from discord import app_commands
 from discord.ext import commands
-from PIL import Image, ImageDraw, ImageFont
-from bot.core.img_edit import get_avatar, remove_acentos_e_caracteres_especiais
+from bot.core.config import Config
+from bot.core.img_edit import (
+    DEFAULT_AVATAR_URL, fetch_avatar, is_avatar_cached, remove_acentos_e_caracteres_especiais
+)
+from bot.core.lru import ByteLRU
+from bot.core.metrics import metrics
+from bot.core.rank_assets import rank_assets
+from bot.core.rank_card import render_leaderboard, render_rank_card
+from bot.core.render_pool import RenderBusy
+from bot.core.rate_limiter import check_rate_limit
+from bot.core.snapshots import stale_notice
 
 logger = logging.getLogger(__name__)
 
-# Caminho base dos assets
-BASE_PATH = Path(__file__).parent.parent.parent
+# URLs de anexos do Discord reaproveitadas (orçamento em bytes das URLs)
+ATTACHMENT_URL_CACHE_BYTES = 1024 * 1024
+# Reenvia a imagem se a URL do anexo expira em menos que isso (s)
+ATTACHMENT_URL_MARGIN = 300
+
+
+def _attachment_expires_at(url: str) -> Optional[float]:
+    """Expiração da URL assinada do CDN do Discord (parâmetro `ex`, hexadecimal)"""
+    expires = parse_qs(urlparse(url).query).get('ex')
+    if not expires:
+        return None
+    try:
+        return float(int(expires[0], 16))
+    except ValueError:
+        return 0.0
+
+
+# Rankings disponíveis no /top-card
+TOP_CARD_RANKINGS = {
+    "top-level": {
+        "title": "Top Nível",
+        "endpoint": "top-level",
+        "fetch": "get_top_level",
+        "args": (10,),
+        "background": "background_1",
+        "value": lambda player: f"Nível {player.get('level', 0)}",
+    },
+    "top-pvp": {
+        "title": "Top PvP",
+        "endpoint": "top-pvp",
+        "fetch": "get_top_pvp",
+        "args": (10,),
+        "background": "background_4",
+        "value": lambda player: f"{player.get('pvpkills', player.get('pvp_count', 0))} PvPs",
+    },
+    "olympiad": {
+        "title": "Ranking da Olimpíada",
+        "endpoint": "olympiad-ranking",
+        "fetch": "get_olympiad_ranking",
+        "args": (),
+        "background": "background_7",
+        "value": lambda player: (
+            f"{player.get('points', player.get('olympiad_points', 0)):,} pontos - "
+            f"{player.get('class_name', 'Unknown')}"
+        ),
+    },
+}
 
 
 class Rank(commands.Cog):
@@ -25,6 +85,19 @@ class Rank(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = bot.db
+        # Cards já codificados: {entradas do card: bytes}
+        self._card_cache = ByteLRU(Config.RANK_CARD_CACHE_BYTES)
+        # URLs de anexos já enviados: {sha1 da imagem: (url do CDN, id da mensagem)}
+        self._attachment_urls = ByteLRU(ATTACHMENT_URL_CACHE_BYTES)
+        # Mensagens de origem dessas URLs, para descartá-las se apagadas: {id da mensagem: sha1}
+        self._attachment_messages = ByteLRU(ATTACHMENT_URL_CACHE_BYTES // 4)
+        # Renderizações de /top-card em andamento: {chave: Task}
+        self._top_card_renders: Dict[tuple, asyncio.Task] = {}
+    
+    async def cog_load(self):
+        """Pré-carrega os assets do rank fora do event loop"""
+        metrics.register_gauge('rank.card_cache_bytes', lambda: self._card_cache.size_bytes)
+        await asyncio.to_thread(rank_assets.load)
     
     async def _get_site_client(self, guild_id: int):
         """Obtém o cliente do site para o servidor"""
@@ -35,6 +108,61 @@ class Rank(commands.Cog):
         
         return await self.bot.get_site_client(server_data['site_domain'])
     
+    async def _send_image(self, interaction: discord.Interaction, image_data: bytes,
+                          name: str, content: str = None):
+        """
+        Envia a imagem como anexo, ou reaproveita a URL do anexo de um envio idêntico
+        
+        A URL do primeiro envio de cada imagem (identificada pelo hash do conteúdo)
+        é guardada; enquanto ela não expira e a mensagem de origem não é apagada,
+        a imagem é exibida em um embed sem reenviar os bytes ao Discord. Se o
+        envio do embed falhar, a imagem é enviada de novo como anexo.
+        """
+        digest = hashlib.sha1(image_data).digest()
+        cached = self._attachment_urls.get(digest)
+        if cached is not None:
+            url, _ = cached
+            expires_at = _attachment_expires_at(url)
+            if expires_at is None or expires_at - time.time() > ATTACHMENT_URL_MARGIN:
+                embed = discord.Embed(color=discord.Color.blurple())
+                embed.set_image(url=url)
+                try:
+                    await interaction.followup.send(content=content, embed=embed)
+                    metrics.incr('rank.upload', result='reused')
+                    return
+                except discord.HTTPException as e:
+                    logger.warning(f"Falha ao reaproveitar anexo, reenviando: {e}")
+                    metrics.incr('rank.upload', result='reuse_failed')
+            self._attachment_urls.pop(digest)
+        
+        file = discord.File(BytesIO(image_data), filename=f"{name}.{Config.RANK_IMAGE_FORMAT}")
+        message = await interaction.followup.send(content=content, file=file, wait=True)
+        metrics.incr('rank.upload', result='uploaded')
+        if message.attachments:
+            url = message.attachments[0].url
+            self._attachment_urls.put(digest, (url, message.id), len(url) + 64)
+            self._attachment_messages.put(message.id, digest, 64)
+    
+    def _forget_attachment(self, message_id: int):
+        """Descarta a URL reaproveitável cujo anexo está na mensagem apagada"""
+        digest = self._attachment_messages.pop(message_id)
+        if digest is None:
+            return
+        cached = self._attachment_urls.get(digest)
+        if cached is not None and cached[1] == message_id:
+            self._attachment_urls.pop(digest)
+    
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """A URL do anexo de uma mensagem apagada deixa de funcionar"""
+        self._forget_attachment(payload.message_id)
+    
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """A URL do anexo de uma mensagem apagada deixa de funcionar"""
+        for message_id in payload.message_ids:
+            self._forget_attachment(message_id)
+    
     async def _get_character_ranking_position(self, client, character_name: str):
         """
         Obtém a posição do personagem no ranking de nível
@@ -64,27 +192,25 @@ class Rank(commands.Cog):
         
         return None
     
-    def _text_align(self, box, text, font_t, draw):
-        """Alinha texto no centro de uma caixa"""
-        x1, y1, x2, y2 = box
-        # Usar textbbox ao invés de textsize (deprecated)
-        bbox = draw.textbbox((0, 0), text.upper(), font=font_t)
-        w = bbox[2] - bbox[0]
-        h = bbox[3] - bbox[1]
-        x = (x2 - x1 - w) // 2 + x1
-        y = (y2 - y1 - h) // 2 + y1
-        return x, y
-    
     async def _generate_rank_image(self, member: discord.Member, character_data: dict, 
                                    user_game_data: dict = None, position: int = None):
         """
         Gera a imagem de rank
         
+        Baixa o avatar aqui e delega decodificação, composição e encode ao RenderPool. Cards já
+        gerados com exatamente as mesmas entradas são servidos do cache.
+        
         Args:
             member: Membro do Discord
             character_data: Dados do personagem do Django
             user_game_data: Dados de XP, conquistas e jogos do usuário
             position: Posição no ranking (opcional)
+        
+        Returns:
+            Bytes da imagem (PNG ou WebP, conforme RANK_IMAGE_FORMAT) ou None
+        
+        Raises:
+            RenderBusy: Se o pool de renderização estiver cheio
         """
         # Backgrounds disponíveis
         background = {
@@ -101,8 +227,8 @@ class Rank(commands.Cog):
             "11": "vip",
         }
         
-        # Escolhe background aleatório (pode ser customizado depois)
-        key_bg = choice(["01", "02", "03", "04", "05", "06", "07", "08", "09"])
+        # Background fixo por usuário (o mesmo card pode ser reaproveitado do cache)
+        key_bg = f"{member.id % 9 + 1:02d}"
         
         # Verifica se é VIP ou staff (pode ser implementado depois)
         # if character_data.get('vip', False):
@@ -110,19 +236,6 @@ class Rank(commands.Cog):
         # if member.id in self.bot.team:  # Se tiver lista de staff
         #     key_bg = "10"
         
-        # Carrega background
-        bg_path = BASE_PATH / "images" / "rank" / "background" / f"{background[key_bg]}.png"
-        if not bg_path.exists():
-            logger.error(f"Background não encontrado: {bg_path}")
-            # Tenta usar background padrão
-            bg_path = BASE_PATH / "images" / "rank" / "background" / "background_1.png"
-            if not bg_path.exists():
-                logger.error("Nenhum background disponível")
-                return None
-        
-        image = Image.open(bg_path).convert('RGBA')
-        draw = ImageDraw.Draw(image)
-        
         # Usa level do sistema PDL se disponível, senão usa do personagem
         if user_game_data:
             level = user_game_data.get('level', 0)
@@ -134,91 +247,59 @@ class Rank(commands.Cog):
             level = character_data.get('level', 0)
             star = min(level // 3, 25)  # Máximo 25 estrelas
         
-        # Carrega overlay de estrelas
-        star_path = BASE_PATH / "images" / "rank" / "star" / f"star_{star}.png"
-        if star_path.exists():
-            stars_dashboard = Image.open(star_path).convert('RGBA')
-            image.paste(stars_dashboard, (0, 0), stars_dashboard)
-        
-        # Retângulos para posicionar elementos
-        rectangles = {
-            "avatar": [9, 8, 119, 142],
-            "patent": [149, 59, 239, 145],
-            "num": [220, 126, 238, 144],
-            "top": [327, 64, 388, 93],
-            "title": [263, 113, 390, 142],
-            "name": [0, 160, 399, 191],
-        }
-        
-        # Adiciona avatar
-        avatar_url = member.display_avatar.url if member.display_avatar else member.default_avatar.url
-        avatar = await get_avatar(avatar_url, 111, 135, True)
-        image.paste(avatar, (rectangles["avatar"][0], rectangles["avatar"][1]), avatar)
-        
-        # Adiciona patente (baseado no nível do sistema PDL)
+        # Patente (baseado no nível do sistema PDL)
         if user_game_data:
             # Usa o método get_patent_level se disponível, senão calcula
             patent = user_game_data.get('level', 1)
             patent = min(max(1, patent), 30)  # Limita a 30
         else:
             patent = min(max(1, level // 5), 30)  # Patente de 1 a 30 baseado no nível
-        patent_path = BASE_PATH / "images" / "patente" / f"{patent}.png"
-        if patent_path.exists():
-            try:
-                patent_img = Image.open(patent_path).convert('RGBA')
-                patent_img = patent_img.resize((80, 80), Image.Resampling.LANCZOS)
-                image.paste(patent_img, (rectangles["patent"][0] + 5, rectangles["patent"][1] - 10), patent_img)
-            except Exception as e:
-                logger.warning(f"Erro ao carregar patente: {e}")
         
-        # Número da patente
-        try:
-            font_small = ImageFont.truetype(str(BASE_PATH / "fonts" / "bot.otf"), 12)
-            x_, y_ = self._text_align(rectangles["num"], str(patent), font_small, draw)
-            draw.text(xy=(x_, y_), text=str(patent).upper(), fill=(255, 255, 255), font=font_small)
-        except Exception as e:
-            logger.warning(f"Erro ao carregar fonte pequena: {e}")
-        
-        # Posição no ranking
-        try:
-            font_position = ImageFont.truetype(str(BASE_PATH / "fonts" / "bot.otf"), 28)
-            position_text = str(position) if position else "?"
-            x_, y_ = self._text_align(rectangles["top"], position_text, font_position, draw)
-            draw.text(xy=(x_, y_), text=position_text.upper(), fill=(0, 0, 0), font=font_position)
-        except Exception as e:
-            logger.warning(f"Erro ao desenhar posição: {e}")
+        position_text = str(position) if position else "?"
+        title = "STAFF" if member.guild_permissions.administrator else "PLAYER"
+        nome = remove_acentos_e_caracteres_especiais(str(member))
+        avatar_asset = member.display_avatar or member.default_avatar
+        encode_options = {
+            'image_format': Config.RANK_IMAGE_FORMAT,
+            'compress_level': Config.RANK_PNG_COMPRESS_LEVEL,
+            'optimize': Config.RANK_PNG_OPTIMIZE,
+            'quality': Config.RANK_WEBP_QUALITY,
+        }
         
-        # Título (PLAYER ou STAFF)
-        try:
-            font_title = ImageFont.truetype(str(BASE_PATH / "fonts" / "bot.otf"), 28)
-            title = "STAFF" if member.guild_permissions.administrator else "PLAYER"
-            x_, y_ = self._text_align(rectangles["title"], title, font_title, draw)
-            draw.text(xy=(x_, y_), text=title.upper(), fill=(0, 0, 0), font=font_title)
-        except Exception as e:
-            logger.warning(f"Erro ao desenhar título: {e}")
+        # Tudo que altera a imagem final faz parte da chave
+        card_key = (
+            background[key_bg], star, avatar_asset.key, patent, position_text, title, nome,
+            tuple(sorted(encode_options.items()))
+        )
+        cached = self._card_cache.get(card_key)
+        if cached is not None:
+            metrics.incr('rank.card_cache', result='hit')
+            return cached
+        metrics.incr('rank.card_cache', result='miss')
         
-        # Nome do usuário
-        try:
-            font_name = ImageFont.truetype(str(BASE_PATH / "fonts" / "bot.otf"), 38)
-            nome = remove_acentos_e_caracteres_especiais(str(member))
-            x_, y_ = self._text_align(rectangles["name"], nome, font_name, draw)
-            # Sombra
-            draw.text(xy=(x_ + 1, y_ + 1), text=nome.upper(), fill=(0, 0, 0), font=font_name)
-            # Texto principal
-            draw.text(xy=(x_, y_), text=nome.upper(), fill=(255, 255, 255), font=font_name)
-        except Exception as e:
-            logger.warning(f"Erro ao desenhar nome: {e}")
+        # Avatar (só os bytes; a decodificação roda no RenderPool)
+        # Pede ao CDN só o tamanho necessário (128px para a caixa de 111x135)
+        avatar_data = await fetch_avatar(avatar_asset.with_size(128).url, cache_key=avatar_asset.key)
         
-        # Salva imagem temporária
-        output_path = BASE_PATH / "rank_temp.png"
-        image.save(output_path)
+        render = partial(
+            render_rank_card,
+            background[key_bg], star, avatar_data, patent, position_text, title, nome,
+            **encode_options
+        )
+        image_data = await self.bot.render_pool.submit(member.guild.id, render)
         
-        return output_path
+        # Se o download falhou e o avatar padrão foi usado, o card não vai para o cache
+        if image_data and is_avatar_cached(avatar_asset.key):
+            self._card_cache.put(card_key, image_data, len(image_data))
+        return image_data
     
     @app_commands.command(name="rank", description="[PAINEL] Mostra seu rank com imagem personalizada")
     @app_commands.describe(login="Login do usuário no site PDL (deixe vazio para usar seu próprio login)")
     async def rank(self, interaction: discord.Interaction, login: str = None):
         """Gera imagem de rank do usuário baseado no XP do PDL"""
+        if not await check_rate_limit(interaction, "rank"):
+            return
+        
         await interaction.response.defer()
         
         try:
@@ -260,29 +341,29 @@ class Rank(commands.Cog):
             }
             
             # Gera imagem
-            image_path = await self._generate_rank_image(
-                interaction.user,
-                character_data,
-                user_game_data,
-                position
-            )
+            try:
+                image_data = await self._generate_rank_image(
+                    interaction.user,
+                    character_data,
+                    user_game_data,
+                    position
+                )
+            except RenderBusy:
+                await interaction.followup.send(
+                    "⏳ Muitas imagens sendo geradas agora. Tente novamente em alguns segundos.",
+                    ephemeral=True
+                )
+                return
             
-            if not image_path or not image_path.exists():
+            if not image_data:
                 await interaction.followup.send(
                     "❌ Erro ao gerar imagem de rank.",
                     ephemeral=True
                 )
                 return
             
-            # Envia imagem
-            file = discord.File(str(image_path), filename="rank.png")
-            await interaction.followup.send(file=file)
-            
-            # Remove arquivo temporário
-            try:
-                image_path.unlink()
-            except:
-                pass
+            # Envia imagem direto da memória (ou reaproveita o anexo de um envio anterior)
+            await self._send_image(interaction, image_data, "rank")
             
         except Exception as e:
             logger.error(f"Erro no comando rank: {e}", exc_info=True)
@@ -290,6 +371,148 @@ class Rank(commands.Cog):
                 f"❌ Erro ao gerar rank: {str(e)}",
                 ephemeral=True
             )
+    
+    async def _render_top_card(self, guild_id: int, domain: str, ranking: str,
+                               results: list, encode_options: dict):
+        """Baixa os avatares em paralelo e decodifica/renderiza o leaderboard no RenderPool"""
+        config = TOP_CARD_RANKINGS[ranking]
+        
+        urls = []
+        for player in results:
+            url = player.get('avatar') or player.get('avatar_url') or DEFAULT_AVATAR_URL
+            if url.startswith('/'):
+                url = f"https://{domain}{url}"
+            urls.append(url)
+        # Cada URL é baixada uma vez (vários jogadores podem usar o avatar padrão)
+        unique_urls = list(dict.fromkeys(urls))
+        downloaded = await asyncio.gather(*(
+            fetch_avatar(url, cache_key=url)
+            for url in unique_urls
+        ))
+        avatars = dict(zip(unique_urls, downloaded))
+        
+        rows = []
+        for i, (player, url) in enumerate(zip(results, urls), 1):
+            try:
+                level = int(player.get('level') or 0)
+            except (TypeError, ValueError):
+                # Nível não numérico: sem patente; a coluna de valor mostra o dado bruto
+                level = 0
+            patent = min(max(1, level // 5), 30) if level else None
+            rows.append((
+                player.get('rank', i),
+                player.get('char_name', 'N/A'),
+                config['value'](player),
+                patent,
+                avatars[url]
+            ))
+        
+        render = partial(
+            render_leaderboard, config['title'], rows, config['background'], **encode_options
+        )
+        return await self.bot.render_pool.submit(guild_id, render)
+    
+    @app_commands.command(name="top-card", description="[PAINEL] Mostra o top de um ranking em uma imagem")
+    @app_commands.describe(
+        ranking="Ranking a exibir",
+        limit="Número de jogadores (padrão: 5, máximo: 10)"
+    )
+    @app_commands.choices(ranking=[
+        app_commands.Choice(name="Nível", value="top-level"),
+        app_commands.Choice(name="PvP", value="top-pvp"),
+        app_commands.Choice(name="Olimpíada", value="olympiad"),
+    ])
+    async def top_card(self, interaction: discord.Interaction,
+                       ranking: app_commands.Choice[str], limit: int = 5):
+        """Gera uma imagem com o top N de um ranking"""
+        if not await check_rate_limit(interaction, "top_card"):
+            return
+        
+        limit = max(1, min(10, limit))
+        await interaction.response.defer()
+        
+        try:
+            client = await self._get_site_client(interaction.guild.id)
+            
+            if not client:
+                await interaction.followup.send(
+                    "❌ Este servidor não está registrado. Use `/register <domínio>` para registrar.",
+                    ephemeral=True
+                )
+                return
+            
+            config = TOP_CARD_RANKINGS[ranking.value]
+            data, stale = await self.bot.snapshots.fetch(
+                client, config['endpoint'], lambda: getattr(client, config['fetch'])(*config['args'])
+            )
+            
+            # Aceita tanto lista direta quanto dict com 'results' (compatibilidade)
+            if isinstance(data, dict) and 'results' in data:
+                data = data['results']
+            if not data or not isinstance(data, list):
+                await interaction.followup.send(
+                    "❌ Não foi possível obter dados do ranking.",
+                    ephemeral=True
+                )
+                return
+            results = data[:limit]
+            
+            encode_options = {
+                'image_format': Config.RANK_IMAGE_FORMAT,
+                'compress_level': Config.RANK_PNG_COMPRESS_LEVEL,
+                'optimize': Config.RANK_PNG_OPTIMIZE,
+                'quality': Config.RANK_WEBP_QUALITY,
+            }
+            
+            # Uma renderização por (domínio, ranking, versão dos dados), compartilhada entre servidores
+            data_version = hashlib.sha1(
+                json.dumps(results, sort_keys=True, default=str).encode('utf-8')
+            ).hexdigest()
+            card_key = ('top-card', client.domain, ranking.value, data_version,
+                        tuple(sorted(encode_options.items())))
+            
+            image_data = self._card_cache.get(card_key)
+            if image_data is not None:
+                metrics.incr('rank.card_cache', result='hit')
+            else:
+                metrics.incr('rank.card_cache', result='miss')
+                # Renderizações simultâneas da mesma chave aguardam a mesma tarefa
+                task = self._top_card_renders.get(card_key)
+                if task is None:
+                    task = asyncio.create_task(self._render_top_card(
+                        interaction.guild.id, client.domain, ranking.value, results, encode_options
+                    ))
+                    self._top_card_renders[card_key] = task
+                    task.add_done_callback(lambda _: self._top_card_renders.pop(card_key, None))
+                try:
+                    image_data = await asyncio.shield(task)
+                except RenderBusy:
+                    await interaction.followup.send(
+                        "⏳ Muitas imagens sendo geradas agora. Tente novamente em alguns segundos.",
+                        ephemeral=True
+                    )
+                    return
+                if image_data:
+                    self._card_cache.put(card_key, image_data, len(image_data))
+            
+            if not image_data:
+                await interaction.followup.send(
+                    "❌ Erro ao gerar imagem do ranking.",
+                    ephemeral=True
+                )
+                return
+            
+            await self._send_image(
+                interaction, image_data, "top",
+                content=stale_notice(stale) if stale else None
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro no comando top-card: {e}", exc_info=True)
+            await interaction.followup.send(
+                f"❌ Erro ao gerar ranking: {str(e)}",
+                ephemeral=True
+            )
 
 
 async def setup(bot):
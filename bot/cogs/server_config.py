@@ -7,6 +7,7 @@ from typing import Optional, Union
 import discord
 from discord import app_commands
 from discord.ext import commands
+from bot.core.rate_limiter import rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -259,7 +260,18 @@ class ServerConfig(commands.Cog):
             inline=False
         )
         
-        embed.set_footer(text="Use /config-set-channel e /config-set-notification para alterar as configurações")
+        rate_limits = config.get('rate_limits') or {}
+        if rate_limits:
+            embed.add_field(
+                name="⏳ Limites de Uso",
+                value="\n".join(
+                    f"**{command}:** {limit['max_requests']} a cada {limit['window_seconds']}s"
+                    for command, limit in rate_limits.items()
+                ),
+                inline=False
+            )
+        
+        embed.set_footer(text="Use /config-set-channel, /config-set-notification e /config-set-rate-limit para alterar as configurações")
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
     
@@ -362,6 +374,55 @@ class ServerConfig(commands.Cog):
                 ephemeral=True
             )
 
+    
+    @app_commands.command(name="config-set-rate-limit", description="[BOT] Define o limite de uso de um comando neste servidor")
+    @app_commands.describe(
+        command="Comando a limitar",
+        max_requests="Usos permitidos por janela (0 para voltar ao padrão)",
+        window_seconds="Janela de tempo em segundos (padrão: 60)"
+    )
+    @app_commands.choices(command=[
+        app_commands.Choice(name=name, value=name)
+        for name in (
+            "rank", "top_card", "bosses", "boss_jewel", "olympiad", "heroes", "siege",
+            "siege_participants", "clan", "auction", "item_search", "top_rich",
+            "top_online", "profile", "dashboard", "stats", "me",
+        )
+    ])
+    @app_commands.default_permissions(manage_guild=True)
+    async def config_set_rate_limit(self, interaction: discord.Interaction,
+                                    command: app_commands.Choice[str],
+                                    max_requests: app_commands.Range[int, 0, 60],
+                                    window_seconds: app_commands.Range[int, 10, 3600] = 60):
+        """Define um limite de uso específico do servidor para um comando"""
+        await interaction.response.defer(ephemeral=True)
+        
+        try:
+            config = await self.db.get_server_config(str(interaction.guild.id))
+            rate_limits = config.get('rate_limits') or {}
+            
+            if max_requests == 0:
+                rate_limits.pop(command.value, None)
+                message = f"✅ Limite de `/{command.value}` voltou ao padrão."
+            else:
+                rate_limits[command.value] = {
+                    "max_requests": max_requests,
+                    "window_seconds": window_seconds
+                }
+                message = f"✅ `/{command.value}` limitado a {max_requests} uso(s) a cada {window_seconds}s por usuário."
+            
+            config['rate_limits'] = rate_limits
+            await self.db.update_server_config(str(interaction.guild.id), config)
+            rate_limiter.set_guild_overrides(interaction.guild.id, rate_limits)
+            
+            await interaction.followup.send(message, ephemeral=True)
+                
+        except Exception as e:
+            logger.error(f"Erro ao definir limite de uso: {e}", exc_info=True)
+            await interaction.followup.send(
+                "❌ Erro ao definir limite de uso. Tente novamente.",
+                ephemeral=True
+            )
 
 async def setup(bot):
     await bot.add_cog(ServerConfig(bot))
@@ -6,6 +6,7 @@ import logging
 import discord
 from discord import app_commands
 from discord.ext import commands
+from bot.core.snapshots import stale_notice
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +42,9 @@ class ServerInfo(commands.Cog):
                 )
                 return
             
-            data = await client.get_players_online()
+            data, stale = await self.bot.snapshots.fetch(
+                client, 'players-online', client.get_players_online
+            )
             
             if not data:
                 await interaction.followup.send(
@@ -61,6 +64,10 @@ class ServerInfo(commands.Cog):
             embed.add_field(name="Jogadores Reais", value=f"{real_players}", inline=True)
             embed.set_footer(text=f"Fonte: {client.domain}")
             
+            if stale:
+                embed.timestamp = stale.as_of
+                embed.set_footer(text=f"Fonte: {client.domain} | {stale_notice(stale)}")
+            
             await interaction.followup.send(embed=embed)
             
         except Exception as e:
@@ -109,9 +109,11 @@ class UserProfile(commands.Cog):
                     embed.add_field(name="Roles", value=roles_str, inline=False)
             
             # Verificar se está autenticado no site
-            from bot.core.auth_manager import AuthManager
-            auth_manager = AuthManager(self.db)
-            if auth_manager.is_authenticated(user.id):
+            server_data = await self.db.get_server_by_discord_id(str(interaction.guild.id)) if interaction.guild else None
+            site_domain = server_data['site_domain'] if server_data else None
+            if site_domain:
+                await self.bot.auth_manager.load_session(user.id, site_domain)
+            if self.bot.auth_manager.is_authenticated(user.id, site_domain):
                 embed.add_field(
                     name="🔐 Autenticação",
                     value="✅ Autenticado no site",
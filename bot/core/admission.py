@@ -0,0 +1,81 @@
+"""
+Controle de admissão das requisições ao site PDL
+Limita a taxa total de requisições por domínio, independente de quantos usuários/servidores as geram
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Token bucket com espera limitada (fila) para obter um token"""
+    
+    def __init__(self, rate: float, burst: int, max_waiters: int = 50):
+        """
+        Args:
+            rate: Tokens repostos por segundo
+            burst: Capacidade máxima do bucket
+            max_waiters: Máximo de requisições aguardando token ao mesmo tempo
+        
+        Raises:
+            ValueError: Se rate não for positivo ou burst for menor que 1
+        """
+        if rate <= 0:
+            raise ValueError(f"rate do TokenBucket deve ser positivo (recebido {rate})")
+        if burst < 1:
+            raise ValueError(f"burst do TokenBucket deve ser ao menos 1 (recebido {burst})")
+        self.rate = rate
+        self.burst = burst
+        self.max_waiters = max_waiters
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters = 0
+    
+    def _refill(self):
+        """Repõe os tokens proporcionalmente ao tempo decorrido"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def has_capacity(self) -> bool:
+        """Indica se há token disponível agora, sem consumir"""
+        self._refill()
+        return self._tokens >= 1
+    
+    def try_acquire(self) -> bool:
+        """Consome um token se houver, sem esperar"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+    
+    async def acquire(self, timeout: float) -> bool:
+        """
+        Consome um token, aguardando na fila até `timeout` segundos
+        
+        Returns:
+            True se obteve o token, False se rejeitado (fila cheia ou tempo esgotado)
+        """
+        if self.try_acquire():
+            return True
+        if self._waiters >= self.max_waiters:
+            return False
+        
+        deadline = time.monotonic() + timeout
+        self._waiters += 1
+        try:
+            while True:
+                wait = (1 - self._tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+                if self.try_acquire():
+                    return True
+        finally:
+            self._waiters -= 1
+    
+    @property
+    def waiting(self) -> int:
+        """Requisições aguardando token"""
+        return self._waiters
@@ -3,23 +3,142 @@ Gerenciador de autenticação JWT para comandos autenticados
 Armazena tokens temporariamente e de forma segura
 """
 
+import asyncio
+import base64
+import heapq
+import json
 import logging
 import time
-from typing import Optional, Dict
+from typing import Awaitable, Callable, Optional, Dict, List, Set, Tuple
+from nacl.exceptions import CryptoError
+from nacl.secret import SecretBox
+from bot.core.config import Config
 from bot.core.database import Database
 
 logger = logging.getLogger(__name__)
 
 
+def jwt_expiry(token: Optional[str]) -> Optional[float]:
+    """
+    Lê o campo `exp` do payload de um JWT (sem validar a assinatura)
+    
+    Returns:
+        Timestamp de expiração ou None se o token não tiver `exp` legível
+    """
+    if not token:
+        return None
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
 class AuthManager:
-    """Gerencia autenticação JWT de forma segura"""
+    """
+    Gerencia autenticação JWT de forma segura
+    
+    Uma única instância por bot (PDLBot.auth_manager), compartilhada por todos os cogs.
+    Os tokens são indexados por (usuário Discord, domínio do site), já que um usuário
+    pode estar em servidores ligados a sites PDL diferentes.
+    
+    A expiração vem do `exp` de cada JWT. O access token é renovado com o refresh
+    token pouco antes de expirar, então a sessão dura até o refresh token expirar.
+    
+    Se AUTH_SESSION_KEY estiver configurada, as sessões também são gravadas
+    criptografadas no MongoDB e restauradas sob demanda após um restart.
+    """
     
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, get_site_client: Optional[Callable[[str], Awaitable]] = None):
+        """
+        Args:
+            db: Instância de Database
+            get_site_client: Função que retorna o SiteClient compartilhado de um domínio
+        """
         self.db = db
-        # Cache de tokens: {user_id: {'access': token, 'refresh': token, 'expires_at': timestamp}}
-        self._token_cache: Dict[int, Dict] = {}
-        # Tokens expiram em 1 hora (padrão JWT)
+        self._get_site_client = get_site_client
+        # Cache de tokens: {(user_id, site_domain): {'access', 'refresh', 'expires_at', 'refresh_expires_at', ...}}
+        self._token_cache: Dict[Tuple[int, str], Dict] = {}
+        # Domínios autenticados de cada usuário: {user_id: {site_domain}}
+        self._user_domains: Dict[int, Set[str]] = {}
+        # Heap de expiração da sessão: (expira_em, user_id, site_domain)
+        # Entradas de tokens substituídos/removidos são descartadas ao saírem do heap
+        self._expiry_heap: List[Tuple[float, int, str]] = []
+        # Renovações em andamento, para que chamadas concorrentes compartilhem uma só
+        self._refreshing: Dict[Tuple[int, str], asyncio.Task] = {}
+        # Cache curto das respostas autenticadas: {(user_id, site_domain): {tipo: (expira_em, dados)}}
+        self._response_cache: Dict[Tuple[int, str], Dict[str, Tuple[float, Dict]]] = {}
+        # TTL usado quando o JWT não informa `exp`
         self._token_ttl = 3600
+        # Persistência criptografada das sessões (desativada sem chave)
+        self._box: Optional[SecretBox] = None
+        if Config.AUTH_SESSION_KEY:
+            try:
+                self._box = SecretBox(base64.b64decode(Config.AUTH_SESSION_KEY))
+            except (ValueError, TypeError) as e:
+                logger.error(f"AUTH_SESSION_KEY inválida, persistência de sessões desativada: {e}")
+    
+    # ==================== PERSISTÊNCIA ====================
+    
+    async def _persist(self, user_id: int, site_domain: str, token_data: Dict):
+        """Grava a sessão criptografada no MongoDB"""
+        if self._box is None:
+            return
+        payload = json.dumps({
+            'access': token_data['access'],
+            'refresh': token_data.get('refresh'),
+            'expires_at': token_data['expires_at'],
+            'refresh_expires_at': token_data.get('refresh_expires_at'),
+            'username': token_data.get('username'),
+        }).encode('utf-8')
+        await self.db.save_auth_session(
+            str(user_id), site_domain, self._box.encrypt(payload), self._session_expiry(token_data)
+        )
+    
+    async def _restore(self, user_id: int, site_domain: str) -> Optional[Dict]:
+        """Restaura do MongoDB a sessão de um usuário que não está em memória"""
+        if self._box is None:
+            return None
+        encrypted = await self.db.get_auth_session(str(user_id), site_domain)
+        if not encrypted:
+            return None
+        try:
+            token_data = json.loads(self._box.decrypt(encrypted).decode('utf-8'))
+        except (CryptoError, ValueError) as e:
+            logger.warning(f"Sessão persistida inválida para usuário {user_id} em {site_domain}: {e}")
+            await self.db.delete_auth_session(str(user_id), site_domain)
+            return None
+        
+        token_data['site_domain'] = site_domain
+        if time.time() >= self._session_expiry(token_data):
+            return None
+        
+        # Outra chamada pode ter restaurado/feito login enquanto aguardava o banco
+        if (user_id, site_domain) not in self._token_cache:
+            self._store(user_id, site_domain, token_data)
+            logger.info(f"Sessão restaurada para usuário {user_id} em {site_domain}")
+        return self._token_cache[(user_id, site_domain)]
+    
+    async def load_session(self, user_id: int, site_domain: str) -> bool:
+        """
+        Garante que a sessão do usuário esteja em memória, restaurando-a se necessário
+        
+        Returns:
+            True se o usuário tem sessão válida no domínio
+        """
+        if self._get_valid(user_id, site_domain) is not None:
+            return True
+        return await self._restore(user_id, site_domain) is not None
+    
+    async def _client(self, site_domain: str):
+        """Retorna o SiteClient do domínio e se ele é temporário (deve ser fechado)"""
+        if self._get_site_client is not None:
+            return await self._get_site_client(site_domain), False
+        
+        from bot.core.site_client import SiteClient
+        return SiteClient(site_domain), True
     
     async def login(self, user_id: int, username: str, password: str, site_domain: str) -> Optional[Dict]:
         """
@@ -30,84 +149,247 @@ class AuthManager:
             username: Nome de usuário do site
             password: Senha (será descartada após login)
             site_domain: Domínio do site
-            
+        
         Returns:
             Dict com tokens ou None se falhar
         """
         try:
-            from bot.core.site_client import SiteClient
-            
-            client = SiteClient(site_domain)
-            result = await client.login(username, password)
-            await client.close()
+            client, temporary = await self._client(site_domain)
+            try:
+                result = await client.login(username, password)
+            finally:
+                if temporary:
+                    await client.close()
             
             if not result or 'access' not in result:
                 return None
             
-            # Armazena token no cache (não no banco de dados por segurança)
-            expires_at = time.time() + self._token_ttl
-            self._token_cache[user_id] = {
-                'access': result['access'],
-                'refresh': result.get('refresh'),
-                'expires_at': expires_at,
+            # Armazena token no cache (no banco apenas criptografado, se habilitado)
+            token_data = self._token_data(result, {
                 'username': username,
                 'site_domain': site_domain
-            }
+            })
+            self._store(user_id, site_domain, token_data)
+            # Novo login (talvez com outra conta do site): descarta as respostas da sessão anterior
+            self._response_cache.pop((user_id, site_domain), None)
+            await self._persist(user_id, site_domain, token_data)
             
-            logger.info(f"Login bem-sucedido para usuário {user_id} ({username})")
+            logger.info(f"Login bem-sucedido para usuário {user_id} ({username}) em {site_domain}")
             return {'success': True, 'username': username}
-            
+        
         except Exception as e:
             logger.error(f"Erro ao fazer login: {e}", exc_info=True)
             return None
     
-    def get_token(self, user_id: int) -> Optional[str]:
+    def _token_data(self, result: Dict, previous: Dict) -> Dict:
+        """Monta os dados do cache a partir da resposta de login/refresh"""
+        now = time.time()
+        access = result['access']
+        # Alguns backends não rotacionam o refresh token
+        refresh = result.get('refresh') or previous.get('refresh')
+        
+        token_data = dict(previous)
+        token_data.update({
+            'access': access,
+            'refresh': refresh,
+            'expires_at': jwt_expiry(access) or now + self._token_ttl,
+            'refresh_expires_at': jwt_expiry(refresh) if refresh else None,
+        })
+        return token_data
+    
+    def _session_expiry(self, token_data: Dict) -> float:
+        """Momento em que a sessão deixa de ser utilizável (nem renovável)"""
+        if token_data.get('refresh'):
+            return max(token_data['expires_at'], token_data.get('refresh_expires_at') or 0)
+        return token_data['expires_at']
+    
+    def _store(self, user_id: int, site_domain: str, token_data: Dict):
+        """Armazena os dados do token e agenda sua expiração"""
+        self._token_cache[(user_id, site_domain)] = token_data
+        self._user_domains.setdefault(user_id, set()).add(site_domain)
+        heapq.heappush(self._expiry_heap, (self._session_expiry(token_data), user_id, site_domain))
+    
+    def _remove(self, user_id: int, site_domain: str):
+        """Remove o token de um usuário em um domínio (e as respostas em cache)"""
+        self._token_cache.pop((user_id, site_domain), None)
+        self._response_cache.pop((user_id, site_domain), None)
+        domains = self._user_domains.get(user_id)
+        if domains is not None:
+            domains.discard(site_domain)
+            if not domains:
+                del self._user_domains[user_id]
+    
+    def _get_valid(self, user_id: int, site_domain: str) -> Optional[Dict]:
+        """Retorna os dados da sessão se existir e não tiver expirado"""
+        token_data = self._token_cache.get((user_id, site_domain))
+        if token_data is None:
+            return None
+        
+        # Verifica se expirou
+        if time.time() >= self._session_expiry(token_data):
+            self._remove(user_id, site_domain)
+            return None
+        
+        return token_data
+    
+    def get_token(self, user_id: int, site_domain: str) -> Optional[str]:
         """
-        Obtém o token de acesso do usuário
+        Obtém o token de acesso do usuário, sem renovar
         
         Args:
             user_id: ID do usuário Discord
-            
+            site_domain: Domínio do site
+        
         Returns:
             Token de acesso ou None se não autenticado/expirado
         """
-        if user_id not in self._token_cache:
+        token_data = self._get_valid(user_id, site_domain)
+        if token_data is None or time.time() >= token_data['expires_at']:
             return None
+        return token_data['access']
+    
+    async def get_valid_token(self, user_id: int, site_domain: str) -> Optional[str]:
+        """
+        Obtém o token de acesso, renovando-o com o refresh token se estiver perto de expirar
         
-        token_data = self._token_cache[user_id]
+        Renovações concorrentes do mesmo usuário/domínio compartilham uma única requisição.
         
-        # Verifica se expirou
-        if time.time() >= token_data['expires_at']:
-            del self._token_cache[user_id]
+        Returns:
+            Token de acesso ou None se não autenticado ou a renovação falhar
+        """
+        token_data = self._get_valid(user_id, site_domain)
+        if token_data is None:
+            token_data = await self._restore(user_id, site_domain)
+            if token_data is None:
+                return None
+        
+        now = time.time()
+        if token_data['expires_at'] - now > Config.TOKEN_REFRESH_MARGIN or not token_data.get('refresh'):
+            return token_data['access'] if now < token_data['expires_at'] else None
+        
+        key = (user_id, site_domain)
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(user_id, site_domain, token_data))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        
+        return await asyncio.shield(task)
+    
+    async def _refresh(self, user_id: int, site_domain: str, token_data: Dict) -> Optional[str]:
+        """Renova o access token usando o refresh token"""
+        try:
+            client, temporary = await self._client(site_domain)
+            try:
+                result = await client.refresh_token(token_data['refresh'])
+            finally:
+                if temporary:
+                    await client.close()
+        except Exception as e:
+            logger.error(f"Erro ao renovar token: {e}", exc_info=True)
+            result = None
+        
+        # O usuário pode ter feito logout/login durante a renovação
+        if self._token_cache.get((user_id, site_domain)) is not token_data:
+            return self.get_token(user_id, site_domain)
+        
+        if not result or 'access' not in result:
+            logger.info(f"Não foi possível renovar o token do usuário {user_id} em {site_domain}")
+            if time.time() < token_data['expires_at']:
+                return token_data['access']
+            self._remove(user_id, site_domain)
             return None
         
-        return token_data['access']
+        new_data = self._token_data(result, token_data)
+        self._store(user_id, site_domain, new_data)
+        try:
+            await self._persist(user_id, site_domain, new_data)
+        except Exception as e:
+            logger.error(f"Erro ao gravar sessão renovada: {e}")
+        logger.debug(f"Token renovado para usuário {user_id} em {site_domain}")
+        return new_data['access']
     
-    def is_authenticated(self, user_id: int) -> bool:
-        """Verifica se o usuário está autenticado"""
-        token = self.get_token(user_id)
-        return token is not None
+    async def fetch_user_data(self, user_id: int, site_domain: str, kind: str, token: str) -> Optional[Dict]:
+        """
+        Busca dados autenticados do usuário com cache curto por usuário/domínio
+        
+        Args:
+            user_id: ID do usuário Discord
+            site_domain: Domínio do site
+            kind: Tipo de dado ('profile', 'dashboard' ou 'stats')
+            token: Token de acesso válido
+            
+        Returns:
+            Dados retornados pelo site ou None se falhar
+        """
+        key = (user_id, site_domain)
+        cached = self._response_cache.get(key, {}).get(kind)
+        if cached and time.time() < cached[0]:
+            return cached[1]
+        
+        username = self._token_cache.get(key, {}).get('username')
+        client, temporary = await self._client(site_domain)
+        try:
+            data = await getattr(client, f'get_user_{kind}')(token)
+        finally:
+            if temporary:
+                await client.close()
+        
+        # Só guarda se a sessão ainda for da mesma conta (pode ter havido logout ou novo login)
+        session = self._token_cache.get(key)
+        if data and session is not None and session.get('username') == username:
+            self._response_cache.setdefault(key, {})[kind] = (time.time() + Config.USER_DATA_CACHE_TTL, data)
+        return data
     
-    def logout(self, user_id: int):
-        """Remove autenticação do usuário"""
-        if user_id in self._token_cache:
-            del self._token_cache[user_id]
-            logger.info(f"Logout do usuário {user_id}")
+    def is_authenticated(self, user_id: int, site_domain: Optional[str] = None) -> bool:
+        """Verifica se o usuário está autenticado no domínio (ou em qualquer domínio, se None)"""
+        if site_domain is not None:
+            return self._get_valid(user_id, site_domain) is not None
+        return any(
+            self._get_valid(user_id, domain) is not None
+            for domain in list(self._user_domains.get(user_id, ()))
+        )
     
-    def get_user_info(self, user_id: int) -> Optional[Dict]:
-        """Obtém informações do usuário autenticado"""
-        if user_id not in self._token_cache:
-            return None
+    async def logout(self, user_id: int, site_domain: Optional[str] = None):
+        """Remove autenticação do usuário no domínio (ou em todos, se None)"""
+        domains = [site_domain] if site_domain is not None else list(self._user_domains.get(user_id, ()))
+        for domain in domains:
+            if (user_id, domain) in self._token_cache:
+                self._remove(user_id, domain)
+                logger.info(f"Logout do usuário {user_id} em {domain}")
         
-        token_data = self._token_cache[user_id]
+        if self._box is not None:
+            await self.db.delete_auth_session(str(user_id), site_domain)
+    
+    def sweep_expired(self) -> int:
+        """
+        Remove sessões expiradas do cache (custo proporcional apenas às expiradas)
         
-        # Verifica se expirou
-        if time.time() >= token_data['expires_at']:
-            del self._token_cache[user_id]
+        Returns:
+            Quantidade de sessões removidas
+        """
+        now = time.time()
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, user_id, site_domain = heapq.heappop(self._expiry_heap)
+            token_data = self._token_cache.get((user_id, site_domain))
+            # Ignora entradas de tokens já substituídos ou removidos
+            if token_data is not None and self._session_expiry(token_data) == expires_at:
+                self._remove(user_id, site_domain)
+                removed += 1
+        return removed
+    
+    def cache_size(self) -> int:
+        """Quantidade de tokens em cache"""
+        return len(self._token_cache)
+    
+    def get_user_info(self, user_id: int, site_domain: str) -> Optional[Dict]:
+        """Obtém informações do usuário autenticado"""
+        token_data = self._get_valid(user_id, site_domain)
+        if token_data is None:
             return None
         
         return {
             'username': token_data.get('username'),
             'site_domain': token_data.get('site_domain')
         }
-
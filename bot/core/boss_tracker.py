@@ -0,0 +1,133 @@
+"""
+Acompanhamento do estado dos bosses por domínio
+Compara cada leitura com a anterior para detectar spawns e mortes e prevê as
+janelas de respawn dos grand bosses para concentrar as consultas nelas
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Chave de um boss: (tipo, nome) - tipo é 'grandboss' ou 'raidboss'
+BossKey = Tuple[str, str]
+
+
+def boss_name(boss: Dict) -> str:
+    """Nome do boss no payload da API"""
+    return boss.get('boss_name') or boss.get('name') or 'Unknown'
+
+
+def respawn_timestamp(boss: Dict) -> Optional[float]:
+    """respawn_time do payload como timestamp, ou None se ausente/inválido"""
+    value = boss.get('respawn_time')
+    if not value or not isinstance(value, str) or value == '-':
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class BossTracker:
+    """
+    Último estado (vivo/morto) conhecido de cada boss, por domínio
+    
+    A primeira leitura de um domínio (ou de um tipo de boss) só define a base;
+    transições são reportadas a partir da segunda.
+    
+    O respawn_time dos grand bosses mortos define janelas de respawn
+    [respawn - window_before, respawn + window_after]; next_poll_at consulta
+    a cada window_interval dentro de uma janela e a cada idle_interval fora.
+    """
+    
+    def __init__(self, idle_interval: float = 300, window_interval: float = 15,
+                 window_before: float = 120, window_after: float = 1800):
+        """
+        Args:
+            idle_interval: Intervalo (s) entre consultas fora das janelas
+            window_interval: Intervalo (s) entre consultas dentro de uma janela
+            window_before: Início da janela (s) antes do respawn_time
+            window_after: Fim da janela (s) depois do respawn_time
+        """
+        self.idle_interval = idle_interval
+        self.window_interval = window_interval
+        self.window_before = window_before
+        self.window_after = window_after
+        # Estrutura: {domínio: {(tipo, nome): vivo}}
+        self._state: Dict[str, Dict[BossKey, bool]] = {}
+        # Tipos já lidos ao menos uma vez: {domínio: {tipo}}
+        self._seen_kinds: Dict[str, set] = {}
+        # Respawns previstos dos grand bosses mortos: {domínio: {nome: timestamp}}
+        self._respawns: Dict[str, Dict[str, float]] = {}
+    
+    def update(self, domain: str, kind: str, bosses: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Registra uma leitura e retorna as transições desde a anterior
+        
+        Args:
+            domain: Domínio do site
+            kind: 'grandboss' ou 'raidboss'
+            bosses: Lista de bosses retornada pela API
+        
+        Returns:
+            (bosses que spawnaram, bosses que morreram)
+        """
+        state = self._state.setdefault(domain, {})
+        seen = self._seen_kinds.setdefault(domain, set())
+        baseline = kind not in seen
+        seen.add(kind)
+        
+        spawned, died = [], []
+        respawns = {}
+        for boss in bosses:
+            if not isinstance(boss, dict):
+                continue
+            key = (kind, boss_name(boss))
+            alive = bool(boss.get('is_alive'))
+            previous = state.get(key)
+            state[key] = alive
+            if kind == 'grandboss' and not alive:
+                respawn_at = respawn_timestamp(boss)
+                if respawn_at is not None:
+                    respawns[key[1]] = respawn_at
+            if baseline or previous is None or previous == alive:
+                continue
+            (spawned if alive else died).append(boss)
+        
+        if kind == 'grandboss':
+            self._respawns[domain] = respawns
+        return spawned, died
+    
+    def _windows(self, domain: str, now: float) -> List[Tuple[float, float]]:
+        """Janelas de respawn (início, fim) ainda não encerradas"""
+        windows = []
+        for respawn_at in self._respawns.get(domain, {}).values():
+            end = respawn_at + self.window_after
+            if end > now:
+                windows.append((respawn_at - self.window_before, end))
+        return windows
+    
+    def in_window(self, domain: str, now: float) -> bool:
+        """Se algum grand boss do domínio está na janela de respawn"""
+        return any(start <= now for start, _ in self._windows(domain, now))
+    
+    def next_poll_at(self, domain: str, now: float) -> float:
+        """
+        Horário da próxima consulta do domínio
+        
+        Dentro de uma janela de respawn, consulta a cada window_interval; fora,
+        a cada idle_interval, antecipando para o início da próxima janela.
+        """
+        windows = self._windows(domain, now)
+        if any(start <= now for start, _ in windows):
+            return now + self.window_interval
+        return min([now + self.idle_interval] + [start for start, _ in windows])
+    
+    def forget(self, domain: str):
+        """Descarta o estado de um domínio (a próxima leitura volta a ser base)"""
+        self._state.pop(domain, None)
+        self._seen_kinds.pop(domain, None)
+        self._respawns.pop(domain, None)
+    
+    def domains(self) -> List[str]:
+        """Domínios acompanhados"""
+        return list(self._state)
@@ -19,13 +19,79 @@ class Config:
     # Default uses Docker service name. Override with MONGODB_URI env var for local development
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://mongodb:27017')
     MONGODB_DB = os.getenv('MONGODB_DB', 'pdl_bot')
+    # Operações acima deste tempo (ms) são registradas no log como lentas
+    MONGODB_SLOW_MS = int(os.getenv('MONGODB_SLOW_MS', '100'))
     
     # API
     API_TIMEOUT = int(os.getenv('API_TIMEOUT', '10'))
     API_RETRY_ATTEMPTS = int(os.getenv('API_RETRY_ATTEMPTS', '3'))
+    # Controle de admissão por domínio: requisições/s, rajada, fila e espera máxima (s)
+    UPSTREAM_RATE = float(os.getenv('UPSTREAM_RATE', '5'))
+    UPSTREAM_BURST = int(os.getenv('UPSTREAM_BURST', '20'))
+    UPSTREAM_MAX_QUEUE = int(os.getenv('UPSTREAM_MAX_QUEUE', '50'))
+    UPSTREAM_QUEUE_TIMEOUT = float(os.getenv('UPSTREAM_QUEUE_TIMEOUT', '3'))
+    # Circuit breaker: falhas consecutivas até considerar o site fora do ar
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+    CIRCUIT_COOLDOWN = int(os.getenv('CIRCUIT_COOLDOWN', '60'))  # segundos
     
     # Cache
     CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))  # 5 minutos
+    # Intervalo mínimo entre gravações do último snapshot válido de cada endpoint
+    SNAPSHOT_WRITE_INTERVAL = int(os.getenv('SNAPSHOT_WRITE_INTERVAL', '60'))
+    
+    # Rate limit
+    # Orçamento global por usuário (unidades de custo por janela), somando todos os comandos
+    USER_RATE_BUDGET = int(os.getenv('USER_RATE_BUDGET', '30'))
+    USER_RATE_BUDGET_WINDOW = int(os.getenv('USER_RATE_BUDGET_WINDOW', '60'))
+    # Rate limit: 'local' (memória do processo) ou 'mongo' (compartilhado entre processos)
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'local').lower()
+    # Requisições reservadas por consulta ao MongoDB no backend compartilhado
+    RATE_LIMIT_LEASE_SIZE = int(os.getenv('RATE_LIMIT_LEASE_SIZE', '3'))
+    
+    # Autenticação: renova o access token quando faltar menos que isso (s) para expirar
+    TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', '120'))
+    # Chave (base64, 32 bytes) para persistir sessões criptografadas; vazio desativa
+    AUTH_SESSION_KEY = os.getenv('AUTH_SESSION_KEY', '')
+    # Tempo (s) em cache dos dados de /account, /dashboard e /mystats por usuário
+    USER_DATA_CACHE_TTL = int(os.getenv('USER_DATA_CACHE_TTL', '30'))
+    
+    # Renderização de imagens (/rank): 'thread' ou 'process'
+    RENDER_MODE = os.getenv('RENDER_MODE', 'thread').lower()
+    RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', '2'))
+    # Renderizações aguardando (total e por servidor) antes de responder "ocupado"
+    RENDER_MAX_QUEUE = int(os.getenv('RENDER_MAX_QUEUE', '20'))
+    RENDER_MAX_PER_GUILD = int(os.getenv('RENDER_MAX_PER_GUILD', '4'))
+    # Orçamento (MB) do cache de avatares decodificados e redimensionados (por processo do RenderPool)
+    AVATAR_CACHE_BYTES = int(float(os.getenv('AVATAR_CACHE_MB', '16')) * 1024 * 1024)
+    # Orçamento (MB) do cache de avatares baixados (bytes do CDN, evita novos downloads)
+    AVATAR_DOWNLOAD_CACHE_BYTES = int(float(os.getenv('AVATAR_DOWNLOAD_CACHE_MB', '8')) * 1024 * 1024)
+    # Orçamento (MB) do cache de cards do /rank já codificados
+    RANK_CARD_CACHE_BYTES = int(float(os.getenv('RANK_CARD_CACHE_MB', '32')) * 1024 * 1024)
+    # Formato da imagem do /rank: 'png' (sem perdas) ou 'webp' (arquivo bem menor)
+    RANK_IMAGE_FORMAT = 'webp' if os.getenv('RANK_IMAGE_FORMAT', 'png').lower() == 'webp' else 'png'
+    RANK_PNG_COMPRESS_LEVEL = int(os.getenv('RANK_PNG_COMPRESS_LEVEL', '3'))  # 0-9
+    RANK_PNG_OPTIMIZE = os.getenv('RANK_PNG_OPTIMIZE', 'false').lower() == 'true'
+    RANK_WEBP_QUALITY = int(os.getenv('RANK_WEBP_QUALITY', '90'))
+    
+    # Notificações: intervalo (s) da consulta de bosses por domínio (0 desativa)
+    BOSS_POLL_INTERVAL = int(os.getenv('BOSS_POLL_INTERVAL', '300'))
+    # Janela de respawn dos grand bosses (s antes/depois do respawn_time) e intervalo (s) dentro dela
+    BOSS_WINDOW_POLL_INTERVAL = int(os.getenv('BOSS_WINDOW_POLL_INTERVAL', '15'))
+    BOSS_WINDOW_BEFORE = int(os.getenv('BOSS_WINDOW_BEFORE', '120'))
+    BOSS_WINDOW_AFTER = int(os.getenv('BOSS_WINDOW_AFTER', '1800'))
+    # Cache (s) da lista de servidores inscritos em notificações (alterações locais invalidam na hora)
+    NOTIFY_SUBSCRIBERS_TTL = int(os.getenv('NOTIFY_SUBSCRIBERS_TTL', '300'))
+    # Avisos de cerco: antecedências (s) e intervalo (s) de atualização da agenda (0 desativa)
+    SIEGE_NOTIFY_OFFSETS = [
+        int(offset) for offset in os.getenv('SIEGE_NOTIFY_OFFSETS', '86400,3600,0').split(',') if offset.strip()
+    ]
+    SIEGE_REFRESH_INTERVAL = int(os.getenv('SIEGE_REFRESH_INTERVAL', '21600'))
+    
+    # Intervalo (s) da limpeza de estado ocioso (rate limiter, tokens expirados)
+    SWEEP_INTERVAL = int(os.getenv('SWEEP_INTERVAL', '120'))
+    
+    # Métricas
+    METRICS_LOG_INTERVAL = int(os.getenv('METRICS_LOG_INTERVAL', '300'))  # 0 desativa
     
     @classmethod
     def validate(cls):
@@ -34,5 +100,7 @@ class Config:
             raise ValueError("DISCORD_BOT_TOKEN não configurado")
         if not cls.MONGODB_URI:
             raise ValueError("MONGODB_URI não configurado")
+        if cls.UPSTREAM_RATE <= 0 or cls.UPSTREAM_BURST < 1:
+            raise ValueError("UPSTREAM_RATE deve ser positivo e UPSTREAM_BURST ao menos 1")
         
         return True
@@ -2,26 +2,78 @@
 Gerenciamento do banco de dados MongoDB
 """
 
+import json
 import logging
-from datetime import datetime
-from typing import Optional, Dict, List
+import zlib
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Tuple, Union
+from bson import Binary
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReturnDocument, monitoring
 from bot.core.config import Config
+from bot.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 
+class CommandLatencyListener(monitoring.CommandListener):
+    """Mede latência dos comandos MongoDB por comando e por coleção"""
+    
+    def __init__(self, slow_ms: int):
+        self.slow_ms = slow_ms
+        # Coleção de cada comando em andamento: {(connection_id, request_id): coleção}
+        self._pending: Dict[Tuple, str] = {}
+    
+    def _collection(self, event: monitoring.CommandStartedEvent) -> str:
+        """Extrai o nome da coleção do comando (ou '-' para comandos administrativos)"""
+        target = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            target = event.command.get('collection')
+        return target if isinstance(target, str) else '-'
+    
+    def started(self, event: monitoring.CommandStartedEvent):
+        self._pending[(event.connection_id, event.request_id)] = self._collection(event)
+    
+    def _finish(self, event, failed: bool):
+        collection = self._pending.pop((event.connection_id, event.request_id), '-')
+        command = event.command_name
+        elapsed_ms = event.duration_micros / 1000
+        
+        metrics.observe('mongo.command_ms', elapsed_ms, command=command)
+        metrics.observe('mongo.collection_ms', elapsed_ms, collection=collection)
+        if failed:
+            metrics.incr('mongo.errors', command=command, collection=collection)
+        
+        if elapsed_ms >= self.slow_ms:
+            logger.warning(
+                f"Operação MongoDB lenta: {command} em {collection} levou {elapsed_ms:.1f}ms"
+            )
+    
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, failed=False)
+    
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, failed=True)
+        logger.warning(f"Comando MongoDB falhou: {event.command_name} - {event.failure}")
+
+
 class Database:
     """Classe para gerenciar conexão e operações no MongoDB"""
     
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
         self.db: Optional[AsyncIOMotorDatabase] = None
+        self.listener = CommandLatencyListener(Config.MONGODB_SLOW_MS)
+        # Incrementado ao fim de cada alteração em servidores/configurações feita por este processo
+        self.servers_version = 0
         
     async def connect(self):
         """Conecta ao MongoDB"""
         try:
-            self.client = AsyncIOMotorClient(Config.MONGODB_URI)
+            self.client = AsyncIOMotorClient(
+                Config.MONGODB_URI,
+                event_listeners=[self.listener]
+            )
             self.db = self.client[Config.MONGODB_DB]
             
             # Testar conexão
@@ -44,6 +96,20 @@ class Database:
             # Índice para site_domain
             await self.db.servers.create_index("site_domain")
             
+            # Índice único para snapshots por domínio/endpoint
+            await self.db.snapshots.create_index(
+                [("site_domain", 1), ("endpoint", 1)], unique=True
+            )
+            
+            # Sessões de autenticação persistidas (criptografadas) expiram sozinhas
+            await self.db.auth_tokens.create_index(
+                [("user_id", 1), ("site_domain", 1)], unique=True
+            )
+            await self.db.auth_tokens.create_index("expires_at", expireAfterSeconds=0)
+            
+            # Contadores de rate limit compartilhado expiram sozinhos (TTL)
+            await self.db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+            
             logger.info("Índices criados")
         except Exception as e:
             logger.error(f"Erro ao criar índices: {e}")
@@ -90,6 +156,10 @@ class Database:
         except Exception as e:
             logger.error(f"Erro ao registrar servidor: {e}")
             raise
+        finally:
+            # Só depois da escrita (com ou sem erro): uma leitura simultânea dos
+            # servidores não pode ficar em cache como atual
+            self.servers_version += 1
     
     async def get_server_by_discord_id(self, discord_guild_id: str) -> Optional[Dict]:
         """Busca servidor pelo ID do Discord"""
@@ -119,6 +189,10 @@ class Database:
         except Exception as e:
             logger.error(f"Erro ao remover servidor: {e}")
             return False
+        finally:
+            # Só depois da escrita (com ou sem erro): uma leitura simultânea dos
+            # servidores não pode ficar em cache como atual
+            self.servers_version += 1
     
     async def list_servers(self) -> List[Dict]:
         """Lista todos os servidores registrados"""
@@ -139,6 +213,10 @@ class Database:
             logger.info(f"Status atualizado: {discord_guild_id} -> {is_active}")
         except Exception as e:
             logger.error(f"Erro ao atualizar status: {e}")
+        finally:
+            # Só depois da escrita (com ou sem erro): uma leitura simultânea dos
+            # servidores não pode ficar em cache como atual
+            self.servers_version += 1
     
     # ==================== CONFIGURAÇÕES DE SERVIDOR ====================
     
@@ -170,6 +248,10 @@ class Database:
             logger.info(f"Configuração atualizada: {discord_guild_id}")
         except Exception as e:
             logger.error(f"Erro ao atualizar configuração: {e}")
+        finally:
+            # Só depois da escrita (com ou sem erro): uma leitura simultânea dos
+            # servidores não pode ficar em cache como atual
+            self.servers_version += 1
     
     async def update_server_config_key(self, discord_guild_id: str, key: str, value):
         """Atualiza uma chave específica da configuração"""
@@ -254,6 +336,102 @@ class Database:
             logger.error(f"Erro ao recuperar cache: {e}")
             return None
     
+    # ==================== SNAPSHOTS ====================
+    
+    async def save_snapshot(self, site_domain: str, endpoint: str, data: Union[Dict, List]):
+        """Grava a última resposta válida de um endpoint (JSON compactado com zlib)"""
+        try:
+            payload = json.dumps(data, separators=(',', ':'), default=str).encode('utf-8')
+            await self.db.snapshots.update_one(
+                {"site_domain": site_domain, "endpoint": endpoint},
+                {"$set": {
+                    "data": Binary(zlib.compress(payload)),
+                    "updated_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Erro ao gravar snapshot: {e}")
+    
+    async def get_snapshot(self, site_domain: str, endpoint: str) -> Optional[Tuple[Union[Dict, List], datetime]]:
+        """Recupera o último snapshot de um endpoint e a data em que foi obtido (UTC)"""
+        try:
+            snapshot = await self.db.snapshots.find_one(
+                {"site_domain": site_domain, "endpoint": endpoint}
+            )
+            if not snapshot:
+                return None
+            data = json.loads(zlib.decompress(snapshot["data"]).decode('utf-8'))
+            return data, snapshot["updated_at"].replace(tzinfo=timezone.utc)
+        except Exception as e:
+            logger.error(f"Erro ao recuperar snapshot: {e}")
+            return None
+    
+    # ==================== SESSÕES DE AUTENTICAÇÃO ====================
+    
+    async def save_auth_session(self, user_id: str, site_domain: str, data: bytes, expires_at: float):
+        """Grava a sessão criptografada de um usuário"""
+        try:
+            await self.db.auth_tokens.update_one(
+                {"user_id": user_id, "site_domain": site_domain},
+                {
+                    "$set": {
+                        "data": Binary(data),
+                        "expires_at": datetime.utcfromtimestamp(expires_at)
+                    },
+                    "$setOnInsert": {"created_at": datetime.utcnow()}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Erro ao gravar sessão: {e}")
+    
+    async def get_auth_session(self, user_id: str, site_domain: str) -> Optional[bytes]:
+        """Recupera a sessão criptografada de um usuário"""
+        try:
+            session = await self.db.auth_tokens.find_one(
+                {"user_id": user_id, "site_domain": site_domain}
+            )
+            return bytes(session["data"]) if session else None
+        except Exception as e:
+            logger.error(f"Erro ao recuperar sessão: {e}")
+            return None
+    
+    async def delete_auth_session(self, user_id: str, site_domain: str = None):
+        """Remove a sessão de um usuário em um domínio (ou em todos, se None)"""
+        try:
+            query = {"user_id": user_id}
+            if site_domain is not None:
+                query["site_domain"] = site_domain
+            await self.db.auth_tokens.delete_many(query)
+        except Exception as e:
+            logger.error(f"Erro ao remover sessão: {e}")
+    
+    # ==================== RATE LIMIT ====================
+    
+    async def rate_limit_increment(self, key: str, amount: int, expires_at: float) -> int:
+        """
+        Incrementa atomicamente um contador de rate limit
+        
+        Args:
+            key: Chave do contador (usuário, comando e janela)
+            amount: Quantidade a incrementar
+            expires_at: Timestamp do fim da janela (o documento expira depois)
+            
+        Returns:
+            Valor do contador após o incremento
+        """
+        result = await self.db.rate_limits.find_one_and_update(
+            {"_id": key},
+            {
+                "$inc": {"count": amount},
+                "$setOnInsert": {"expires_at": datetime.utcfromtimestamp(expires_at)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return result["count"]
+    
     # ==================== UTILS ====================
     
     def _normalize_domain(self, domain: str) -> str:
@@ -2,11 +2,19 @@
 Módulo para edição de imagens - adaptado do projeto Ashley
 """
 
+import asyncio
+import hashlib
 import re
+import threading
 import unicodedata
 import aiohttp
+from functools import lru_cache
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageOps, UnidentifiedImageError
+from typing import Optional, Tuple
+from PIL import Image, ImageDraw, UnidentifiedImageError
+from bot.core.config import Config
+from bot.core.lru import ByteLRU
+from bot.core.metrics import metrics
 
 
 def remove_acentos_e_caracteres_especiais(word):
@@ -19,58 +27,166 @@ def remove_acentos_e_caracteres_especiais(word):
     return re.sub(r'[^a-zA-Z \\]', '', palavra_sem_acento)
 
 
-async def get_avatar(display_avatar_url: str, x: int = -1, y: int = -1, rect: bool = False):
+# Sessão HTTP compartilhada para baixar avatares (criada sob demanda)
+_session: Optional[aiohttp.ClientSession] = None
+
+# Avatares já baixados, como vieram do CDN: {chave: bytes}
+_avatar_cache = ByteLRU(Config.AVATAR_DOWNLOAD_CACHE_BYTES)
+
+# Avatares já decodificados e redimensionados (RGBA), no processo do RenderPool:
+# {(sha1 dos bytes, x, y, rect): Image}. Com RENDER_MODE=process cada worker tem o seu.
+_decoded_cache = ByteLRU(Config.AVATAR_CACHE_BYTES)
+# As threads do RenderPool compartilham o cache
+_decoded_lock = threading.Lock()
+
+# URL padrão caso o avatar não seja válido
+DEFAULT_AVATAR_URL = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Retorna a sessão HTTP compartilhada"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+    return _session
+
+
+async def close_session():
+    """Fecha a sessão HTTP compartilhada"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def is_avatar_cached(cache_key: str) -> bool:
+    """Indica se o avatar da chave foi baixado com sucesso e está em cache"""
+    return cache_key in _avatar_cache
+
+
+def avatar_cache_bytes() -> int:
+    """Bytes ocupados pelo cache de avatares decodificados (neste processo)"""
+    return _decoded_cache.size_bytes
+
+
+def avatar_download_cache_bytes() -> int:
+    """Bytes ocupados pelo cache de avatares baixados"""
+    return _avatar_cache.size_bytes
+
+
+async def _download_image(url: str) -> Optional[bytes]:
+    """Baixa uma imagem sem decodificá-la (None em caso de erro)"""
+    try:
+        async with _get_session().get(url) as response:
+            if response.status != 200 or not response.content_type.startswith('image/'):
+                return None
+            return await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+
+
+@lru_cache(maxsize=32)
+def _circle_mask(size: Tuple[int, int]) -> Image.Image:
+    """Máscara circular suavizada (supersampling 3x) para o tamanho dado, em cache"""
+    big = (size[0] * 3, size[1] * 3)
+    mascara = Image.new('L', big, 0)
+    ImageDraw.Draw(mascara).ellipse((0, 0) + big, fill=255)
+    return mascara.resize(size, Image.Resampling.LANCZOS)
+
+
+def process_avatar(avatar: Image.Image, x: int = -1, y: int = -1, rect: bool = False) -> Image.Image:
     """
-    Baixa e processa avatar do Discord
+    Redimensiona o avatar e, se não for retangular, recorta em círculo
     
     Args:
-        display_avatar_url: URL do avatar do Discord
+        avatar: Avatar decodificado em RGBA (pode ser modificado)
+    """
+    # Redimensiona se necessário
+    if x >= 0 and y >= 0 and avatar.size != (x, y):
+        avatar = avatar.resize((x, y), Image.Resampling.LANCZOS)
+    
+    # Se não for retangular, faz círculo (a máscara substitui o canal alfa)
+    if not rect:
+        avatar.putalpha(_circle_mask(avatar.size))
+    
+    return avatar
+
+
+def decode_avatar(data: Optional[bytes], x: int = -1, y: int = -1, rect: bool = False) -> Image.Image:
+    """
+    Decodifica e processa um avatar baixado (trabalho de CPU: rodar no RenderPool)
+    
+    O resultado fica em cache LRU (limitado em bytes) pelo hash do conteúdo e
+    pelo tamanho pedido, então o mesmo avatar não é decodificado de novo.
+    
+    Args:
+        data: Bytes retornados por fetch_avatar (None usa uma imagem cinza)
         x: Largura desejada (-1 para manter original)
         y: Altura desejada (-1 para manter original)
         rect: Se True, mantém formato retangular; se False, faz círculo
     
     Returns:
-        PIL Image com o avatar processado
+        Avatar em RGBA. Pode ser a instância do cache: não deve ser modificado.
     """
-    # URL padrão caso o avatar não seja válido
-    default_avatar = "https://cdn.discordapp.com/embed/avatars/0.png"
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(display_avatar_url) as response:
-                if response.status == 200:
-                    avatar_bytes = await response.read()
-                    avatar = Image.open(BytesIO(avatar_bytes)).convert('RGBA')
-                else:
-                    # Se falhar, tenta o avatar padrão
-                    async with session.get(default_avatar) as response:
-                        avatar_bytes = await response.read()
-                        avatar = Image.open(BytesIO(avatar_bytes)).convert('RGBA')
-    except (aiohttp.ClientError, UnidentifiedImageError, Exception):
-        # Em caso de erro, usa avatar padrão
+    key = None
+    avatar = None
+    if data:
+        key = (hashlib.sha1(data).digest(), x, y, rect)
+        with _decoded_lock:
+            cached = _decoded_cache.get(key)
+        if cached is not None:
+            metrics.incr('avatar.decoded_cache', result='hit')
+            return cached
+        metrics.incr('avatar.decoded_cache', result='miss')
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(default_avatar) as response:
-                    avatar_bytes = await response.read()
-                    avatar = Image.open(BytesIO(avatar_bytes)).convert('RGBA')
-        except Exception:
-            # Se tudo falhar, cria uma imagem padrão
-            avatar = Image.new('RGBA', (111, 135), (128, 128, 128, 255))
-
-    # Redimensiona se necessário
-    if x >= 0 and y >= 0:
-        avatar = avatar.resize((x, y), Image.Resampling.LANCZOS)
+            avatar = Image.open(BytesIO(data)).convert('RGBA')
+        except (UnidentifiedImageError, OSError):
+            avatar = None
+    if avatar is None:
+        # Se tudo falhar, cria uma imagem padrão (fora do cache)
+        key = None
+        avatar = Image.new('RGBA', (111, 135), (128, 128, 128, 255))
+    
+    avatar = process_avatar(avatar, x, y, rect)
+    if key is not None:
+        with _decoded_lock:
+            _decoded_cache.put(key, avatar, avatar.width * avatar.height * 4)
+    return avatar
 
-    # Se não for retangular, faz círculo
-    if not rect:
-        big_avatar = (avatar.size[0] * 3, avatar.size[1] * 3)
-        mascara = Image.new('L', big_avatar, 0)
-        trim = ImageDraw.Draw(mascara)
-        trim.ellipse((0, 0) + big_avatar, fill=255)
-        mascara = mascara.resize(avatar.size, Image.Resampling.LANCZOS)
-        avatar.putalpha(mascara)
-        exit_avatar = ImageOps.fit(avatar, mascara.size, centering=(0.5, 0.5))
-        exit_avatar.putalpha(mascara)
-        avatar = exit_avatar
 
-    return avatar
+async def fetch_avatar(display_avatar_url: str, cache_key: Optional[str] = None) -> Optional[bytes]:
+    """
+    Baixa o avatar do Discord sem decodificá-lo
+    
+    A decodificação e o redimensionamento (decode_avatar) rodam no RenderPool
+    junto com a renderização do card, fora do event loop.
+    
+    Args:
+        display_avatar_url: URL do avatar do Discord (de preferência já no tamanho
+            necessário, ex: display_avatar.with_size(128).url)
+        cache_key: Identificador do conteúdo do avatar (ex: display_avatar.key);
+            se informado, os bytes ficam em cache LRU
+    
+    Returns:
+        Bytes da imagem (o avatar padrão se o download falhar) ou None
+    """
+    if cache_key is not None:
+        cached = _avatar_cache.get(cache_key)
+        if cached is not None:
+            metrics.incr('avatar.cache', result='hit')
+            return cached
+        metrics.incr('avatar.cache', result='miss')
+    
+    data = await _download_image(display_avatar_url)
+    if data is not None:
+        if cache_key is not None:
+            _avatar_cache.put(cache_key, data, len(data))
+        return data
+    
+    # Se falhar, tenta o avatar padrão (em cache pela própria URL, não pela chave pedida)
+    data = _avatar_cache.get(DEFAULT_AVATAR_URL)
+    if data is None:
+        data = await _download_image(DEFAULT_AVATAR_URL)
+        if data is not None:
+            _avatar_cache.put(DEFAULT_AVATAR_URL, data, len(data))
+    return data
@@ -0,0 +1,68 @@
+"""
+Cache LRU limitado pelo tamanho em bytes dos valores
+"""
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class ByteLRU:
+    """
+    Cache LRU com orçamento em bytes
+    
+    Cada valor é inserido com o seu tamanho; os menos usados recentemente são
+    removidos até o total caber em max_bytes. Valores maiores que o orçamento
+    não são armazenados.
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # Estrutura: {chave: (valor, tamanho)}
+        self._items: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._bytes = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna o valor (marcando-o como recente) ou None"""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        self._items.move_to_end(key)
+        return item[0]
+    
+    def put(self, key: Hashable, value: Any, size: int):
+        """Armazena o valor, removendo os menos usados se necessário"""
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        if size > self.max_bytes:
+            return
+        
+        self._items[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self._bytes -= evicted_size
+    
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove e retorna o valor, ou None"""
+        item = self._items.pop(key, None)
+        if item is None:
+            return None
+        self._bytes -= item[1]
+        return item[0]
+    
+    def clear(self):
+        """Remove todos os valores"""
+        self._items.clear()
+        self._bytes = 0
+    
+    @property
+    def size_bytes(self) -> int:
+        """Total de bytes armazenados"""
+        return self._bytes
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
@@ -0,0 +1,143 @@
+"""
+Registro de métricas em memória (contadores, gauges e histogramas)
+Usado para medir latências e volumes internos do bot
+"""
+
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Limites dos buckets dos histogramas (em milissegundos)
+DEFAULT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _make_key(name: str, labels: Dict[str, str]) -> MetricKey:
+    """Monta a chave de uma métrica a partir do nome e labels"""
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_key(key: MetricKey) -> str:
+    """Formata a chave no estilo nome{label=valor}"""
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class Histogram:
+    """Histograma com buckets fixos"""
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, value: float):
+        """Registra uma observação"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+    
+    def percentile(self, p: float) -> float:
+        """Retorna o limite superior do bucket que contém o percentil p (0-100)"""
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for idx, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return float(self.buckets[idx]) if idx < len(self.buckets) else self.max
+        return self.max
+    
+    def summary(self) -> Dict:
+        """Resumo do histograma"""
+        return {
+            'count': self.count,
+            'avg': round(self.total / self.count, 2) if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': round(self.max, 2),
+        }
+
+
+class Metrics:
+    """Registro thread-safe de contadores, gauges e histogramas"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, int] = {}
+        self._gauges: Dict[MetricKey, Callable[[], float]] = {}
+        self._histograms: Dict[MetricKey, Histogram] = {}
+    
+    def incr(self, name: str, value: int = 1, **labels):
+        """Incrementa um contador"""
+        key = _make_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels):
+        """Registra uma observação em um histograma"""
+        key = _make_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+    
+    def register_gauge(self, name: str, func: Callable[[], float], **labels):
+        """Registra um gauge calculado sob demanda"""
+        with self._lock:
+            self._gauges[_make_key(name, labels)] = func
+    
+    def get_counter(self, name: str, **labels) -> int:
+        """Valor atual de um contador"""
+        with self._lock:
+            return self._counters.get(_make_key(name, labels), 0)
+    
+    def get_histogram(self, name: str, **labels) -> Optional[Histogram]:
+        """Histograma registrado (ou None)"""
+        with self._lock:
+            return self._histograms.get(_make_key(name, labels))
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """Retorna uma cópia de todas as métricas"""
+        with self._lock:
+            counters = {_format_key(k): v for k, v in self._counters.items()}
+            histograms = {_format_key(k): h.summary() for k, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+        
+        gauge_values = {}
+        for key, func in gauges.items():
+            try:
+                gauge_values[_format_key(key)] = func()
+            except Exception as e:
+                logger.debug(f"Erro ao calcular gauge {_format_key(key)}: {e}")
+        
+        return {'counters': counters, 'gauges': gauge_values, 'histograms': histograms}
+    
+    def log_summary(self):
+        """Escreve o resumo das métricas no log"""
+        snapshot = self.snapshot()
+        for name, value in sorted(snapshot['counters'].items()):
+            logger.info(f"[métricas] {name} = {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            logger.info(f"[métricas] {name} = {value}")
+        for name, summary in sorted(snapshot['histograms'].items()):
+            logger.info(
+                f"[métricas] {name} count={summary['count']} avg={summary['avg']} "
+                f"p50={summary['p50']} p99={summary['p99']} max={summary['max']}"
+            )
+
+
+# Instância global de métricas
+metrics = Metrics()
@@ -0,0 +1,228 @@
+"""
+Cache dos assets da imagem de rank
+Backgrounds, estrelas, patentes e fontes são lidos do disco e decodificados uma única vez
+
+Para não decodificar os PNGs em cada processo, gere o blob pré-decodificado:
+    python -m bot.core.rank_assets
+"""
+
+import json
+import logging
+import mmap
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from PIL import Image, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Caminho base dos assets
+BASE_PATH = Path(__file__).parent.parent.parent
+
+# Versão do formato do blob pré-decodificado
+BLOB_VERSION = 1
+
+# Tamanho em que as patentes são coladas no card
+PATENT_SIZE = (80, 80)
+
+# Fonte usada nos textos do card
+FONT_PATH = BASE_PATH / "fonts" / "bot.otf"
+
+
+@lru_cache(maxsize=None)
+def get_font(size: int) -> ImageFont.FreeTypeFont:
+    """Fonte do card no tamanho pedido (carregada uma vez por tamanho)"""
+    return ImageFont.truetype(str(FONT_PATH), size)
+
+
+@lru_cache(maxsize=2048)
+def text_size(text: str, size: int) -> Tuple[int, int]:
+    """
+    Largura e altura do texto renderizado na fonte do card
+    
+    Memoizado: textos fixos (PLAYER, STAFF, números de patente e posição)
+    são medidos uma única vez.
+    """
+    bbox = get_font(size).getbbox(text)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+class RankAssets:
+    """
+    Imagens decodificadas (RGBA) usadas pelo /rank
+    
+    As imagens em cache nunca devem ser modificadas: o background é copiado
+    antes de desenhar, e estrelas/patentes são apenas coladas sobre a cópia.
+    """
+    
+    def __init__(self, base_path: Path = BASE_PATH, blob_path: Optional[Path] = None):
+        self.base_path = base_path
+        self.blob_path = blob_path or base_path / "build" / "rank_assets.bin"
+        self.backgrounds: Dict[str, Image.Image] = {}
+        self.stars: Dict[int, Image.Image] = {}
+        self.patents: Dict[int, Image.Image] = {}
+        self._mmap: Optional[mmap.mmap] = None
+        self._loaded = False
+    
+    @staticmethod
+    def _open(path: Path) -> Optional[Image.Image]:
+        """Abre e decodifica uma imagem em RGBA"""
+        try:
+            with Image.open(path) as img:
+                img = img.convert('RGBA')
+            img.load()
+            return img
+        except Exception as e:
+            logger.warning(f"Erro ao carregar asset {path}: {e}")
+            return None
+    
+    def _sources(self) -> Iterator[Tuple[str, object, Path]]:
+        """Arquivos de origem dos assets: (grupo, chave, caminho)"""
+        for path in sorted((self.base_path / "images" / "rank" / "background").glob("*.png")):
+            yield "backgrounds", path.stem, path
+        for path in sorted((self.base_path / "images" / "rank" / "star").glob("star_*.png")):
+            yield "stars", int(path.stem.split("_")[1]), path
+        for path in sorted((self.base_path / "images" / "patente").glob("*.png")):
+            if path.stem.isdigit():
+                yield "patents", int(path.stem), path
+    
+    def _decode_sources(self):
+        """Decodifica os PNGs de origem (patentes já redimensionadas)"""
+        for group, key, path in self._sources():
+            img = self._open(path)
+            if img is None:
+                continue
+            if group == "patents":
+                img = img.resize(PATENT_SIZE, Image.Resampling.LANCZOS)
+            getattr(self, group)[key] = img
+    
+    def _blob_is_fresh(self, blob_path: Path, index: Dict) -> bool:
+        """Confere se o blob foi gerado a partir dos arquivos atuais"""
+        sources = [path for _, _, path in self._sources()]
+        if len(sources) != index.get("sources"):
+            return False
+        built_at = blob_path.stat().st_mtime
+        return all(path.stat().st_mtime <= built_at for path in sources)
+    
+    def _load_blob(self, blob_path: Path) -> bool:
+        """
+        Carrega os assets do blob RGBA pré-decodificado via mmap
+        
+        As imagens são criadas com Image.frombuffer sobre o mapeamento (somente
+        leitura), então processos diferentes compartilham as mesmas páginas e
+        nenhum PNG é decodificado.
+        
+        Returns:
+            True se carregou do blob, False se o blob não existe ou está desatualizado
+        """
+        index_path = blob_path.with_suffix(".json")
+        if not blob_path.exists() or not index_path.exists():
+            return False
+        try:
+            index = json.loads(index_path.read_text(encoding="utf-8"))
+            if index.get("version") != BLOB_VERSION or not self._blob_is_fresh(blob_path, index):
+                logger.warning(f"Blob de assets desatualizado ({blob_path}), decodificando os PNGs")
+                return False
+            
+            with open(blob_path, "rb") as blob_file:
+                mapped = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+            for entry in index["entries"]:
+                size = (entry["width"], entry["height"])
+                data = view[entry["offset"]:entry["offset"] + size[0] * size[1] * 4]
+                img = Image.frombuffer("RGBA", size, data, "raw", "RGBA", 0, 1)
+                key = entry["key"] if entry["group"] == "backgrounds" else int(entry["key"])
+                getattr(self, entry["group"])[key] = img
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Erro ao carregar blob de assets {blob_path}: {e}")
+            self.backgrounds.clear()
+            self.stars.clear()
+            self.patents.clear()
+            return False
+        
+        self._mmap = mapped
+        return True
+    
+    def load(self):
+        """Carrega todos os assets (do blob, se houver, senão dos PNGs) (idempotente)"""
+        if self._loaded:
+            return
+        
+        source = "blob"
+        if not self._load_blob(self.blob_path):
+            source = "PNG"
+            self._decode_sources()
+        
+        self._loaded = True
+        logger.info(
+            f"Assets de rank carregados ({source}): {len(self.backgrounds)} backgrounds, "
+            f"{len(self.stars)} estrelas, {len(self.patents)} patentes"
+        )
+    
+    def build_blob(self, blob_path: Optional[Path] = None) -> Path:
+        """
+        Gera o blob RGBA pré-decodificado e o índice JSON ao lado dele
+        
+        Returns:
+            Caminho do blob gerado
+        """
+        blob_path = blob_path or self.blob_path
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        self._decode_sources()
+        
+        entries = []
+        offset = 0
+        with open(blob_path, "wb") as blob_file:
+            for group in ("backgrounds", "stars", "patents"):
+                for key, img in getattr(self, group).items():
+                    data = img.tobytes("raw", "RGBA")
+                    blob_file.write(data)
+                    entries.append({
+                        "group": group,
+                        "key": str(key),
+                        "offset": offset,
+                        "width": img.width,
+                        "height": img.height,
+                    })
+                    offset += len(data)
+        
+        index = {
+            "version": BLOB_VERSION,
+            "sources": sum(1 for _ in self._sources()),
+            "entries": entries,
+        }
+        blob_path.with_suffix(".json").write_text(json.dumps(index, indent=1), encoding="utf-8")
+        logger.info(f"Blob de assets gerado: {blob_path} ({len(entries)} imagens, {offset / 1024 / 1024:.1f} MB)")
+        return blob_path
+    
+    def background(self, name: str) -> Optional[Image.Image]:
+        """Retorna uma cópia do background (ou do background_1, se não existir)"""
+        self.load()
+        img = self.backgrounds.get(name)
+        if img is None:
+            logger.error(f"Background não encontrado: {name}")
+            img = self.backgrounds.get("background_1")
+            if img is None:
+                return None
+        return img.copy()
+    
+    def star(self, count: int) -> Optional[Image.Image]:
+        """Overlay de estrelas (somente leitura)"""
+        self.load()
+        return self.stars.get(count)
+    
+    def patent(self, level: int) -> Optional[Image.Image]:
+        """Patente já redimensionada (somente leitura)"""
+        self.load()
+        return self.patents.get(level)
+
+
+# Instância global dos assets de rank
+rank_assets = RankAssets()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    output = Path(sys.argv[1]) if len(sys.argv) > 1 else None
+    RankAssets().build_blob(output)
@@ -0,0 +1,277 @@
+"""
+Renderização da imagem de rank (PIL)
+Funções puras e síncronas, executadas no RenderPool fora do event loop
+"""
+
+import logging
+import unicodedata
+from functools import lru_cache
+from io import BytesIO
+from typing import List, Optional, Tuple
+from PIL import Image, ImageDraw
+from bot.core.img_edit import decode_avatar
+from bot.core.rank_assets import get_font, rank_assets, text_size
+
+logger = logging.getLogger(__name__)
+
+# Retângulos para posicionar elementos
+RECTANGLES = {
+    "avatar": [9, 8, 119, 142],
+    "patent": [149, 59, 239, 145],
+    "num": [220, 126, 238, 144],
+    "top": [327, 64, 388, 93],
+    "title": [263, 113, 390, 142],
+    "name": [0, 160, 399, 191],
+}
+
+# Tamanho (largura, altura) do avatar colado no card
+AVATAR_SIZE = (111, 135)
+
+
+def text_align(box, text, font_size):
+    """Alinha texto no centro de uma caixa"""
+    x1, y1, x2, y2 = box
+    # Medidas memoizadas (equivalentes a draw.textbbox)
+    w, h = text_size(text.upper(), font_size)
+    x = (x2 - x1 - w) // 2 + x1
+    y = (y2 - y1 - h) // 2 + y1
+    return x, y
+
+
+def encode_image(image: Image.Image, image_format: str = 'png', compress_level: int = 3,
+                 optimize: bool = False, quality: int = 90) -> bytes:
+    """
+    Codifica a imagem em memória
+    
+    Args:
+        image_format: 'png' (sem perdas) ou 'webp' (menor, com perdas)
+        compress_level: Nível de compressão do PNG (0-9; mais alto é mais lento)
+        optimize: Passada extra de otimização do PNG (bem mais lenta)
+        quality: Qualidade do WebP (0-100)
+    """
+    output = BytesIO()
+    if image_format == 'webp':
+        image.save(output, format='WEBP', quality=quality)
+    else:
+        image.save(output, format='PNG', compress_level=compress_level, optimize=optimize)
+    return output.getvalue()
+
+
+def paste_layers(background_name: str, star: int, avatar: Image.Image, patent: int) -> Optional[Image.Image]:
+    """
+    Monta as camadas de imagem do card: background, estrelas, avatar e patente
+    
+    Returns:
+        Nova imagem (cópia do background) ou None se não houver background
+    """
+    # Cópia do background em cache (cai para o background_1 se não existir)
+    image = rank_assets.background(background_name)
+    if image is None:
+        logger.error("Nenhum background disponível")
+        return None
+    
+    # Overlay de estrelas
+    stars_dashboard = rank_assets.star(star)
+    if stars_dashboard is not None:
+        image.paste(stars_dashboard, (0, 0), stars_dashboard)
+    
+    # Avatar
+    image.paste(avatar, (RECTANGLES["avatar"][0], RECTANGLES["avatar"][1]), avatar)
+    
+    # Patente
+    patent_img = rank_assets.patent(patent)
+    if patent_img is not None:
+        image.paste(patent_img, (RECTANGLES["patent"][0] + 5, RECTANGLES["patent"][1] - 10), patent_img)
+    
+    return image
+
+
+def draw_texts(image: Image.Image, patent: int, position_text: str, title: str, name: str):
+    """Escreve os textos do card (patente, posição, título e nome) sobre a imagem"""
+    draw = ImageDraw.Draw(image)
+    
+    # Número da patente
+    try:
+        font_small = get_font(12)
+        x_, y_ = text_align(RECTANGLES["num"], str(patent), 12)
+        draw.text(xy=(x_, y_), text=str(patent).upper(), fill=(255, 255, 255), font=font_small)
+    except Exception as e:
+        logger.warning(f"Erro ao carregar fonte pequena: {e}")
+    
+    # Posição no ranking
+    try:
+        font_position = get_font(28)
+        x_, y_ = text_align(RECTANGLES["top"], position_text, 28)
+        draw.text(xy=(x_, y_), text=position_text.upper(), fill=(0, 0, 0), font=font_position)
+    except Exception as e:
+        logger.warning(f"Erro ao desenhar posição: {e}")
+    
+    # Título (PLAYER ou STAFF)
+    try:
+        font_title = get_font(28)
+        x_, y_ = text_align(RECTANGLES["title"], title, 28)
+        draw.text(xy=(x_, y_), text=title.upper(), fill=(0, 0, 0), font=font_title)
+    except Exception as e:
+        logger.warning(f"Erro ao desenhar título: {e}")
+    
+    # Nome do usuário
+    try:
+        font_name = get_font(38)
+        x_, y_ = text_align(RECTANGLES["name"], name, 38)
+        # Sombra
+        draw.text(xy=(x_ + 1, y_ + 1), text=name.upper(), fill=(0, 0, 0), font=font_name)
+        # Texto principal
+        draw.text(xy=(x_, y_), text=name.upper(), fill=(255, 255, 255), font=font_name)
+    except Exception as e:
+        logger.warning(f"Erro ao desenhar nome: {e}")
+
+
+def compose_rank_card(background_name: str, star: int, avatar: Image.Image, patent: int,
+                      position_text: str, title: str, name: str) -> Optional[Image.Image]:
+    """
+    Compõe a imagem de rank (sem codificar)
+    
+    Args:
+        background_name: Nome do background (ex: background_1)
+        star: Quantidade de estrelas (0-25)
+        avatar: Avatar já redimensionado para a caixa do card
+        patent: Patente (1-30)
+        position_text: Posição no ranking ("?" se desconhecida)
+        title: PLAYER ou STAFF
+        name: Nome exibido (sem acentos)
+    
+    Returns:
+        Imagem RGBA do card, ou None se não houver background
+    """
+    image = paste_layers(background_name, star, avatar, patent)
+    if image is not None:
+        draw_texts(image, patent, position_text, title, name)
+    return image
+
+
+def render_rank_card(background_name: str, star: int, avatar_data: Optional[bytes], patent: int,
+                     position_text: str, title: str, name: str, **encode_options) -> Optional[bytes]:
+    """
+    Decodifica o avatar, compõe a imagem de rank e a codifica em memória
+    
+    Recebe os mesmos argumentos de compose_rank_card, exceto o avatar, que vem
+    como os bytes baixados (fetch_avatar); encode_options são repassados para
+    encode_image.
+    
+    Returns:
+        Bytes da imagem gerada, ou None se não houver background
+    """
+    avatar = decode_avatar(avatar_data, *AVATAR_SIZE, True)
+    image = compose_rank_card(background_name, star, avatar, patent, position_text, title, name)
+    if image is None:
+        return None
+    return encode_image(image, **encode_options)
+
+
+# ==================== LEADERBOARD ====================
+
+LEADERBOARD_WIDTH = 400
+LEADERBOARD_HEADER = 50
+LEADERBOARD_ROW = 56
+LEADERBOARD_AVATAR = 48
+LEADERBOARD_PATENT = 40
+LEADERBOARD_NAME_WIDTH = 200
+
+
+def card_text(text: str) -> str:
+    """Remove acentos e coloca em maiúsculas (mantém números e pontuação)"""
+    nfkd = unicodedata.normalize('NFKD', str(text))
+    return "".join(c for c in nfkd if not unicodedata.combining(c)).upper()
+
+
+@lru_cache(maxsize=32)
+def _small_patent(level: int) -> Optional[Image.Image]:
+    """Patente reduzida para as linhas do leaderboard (somente leitura)"""
+    patent = rank_assets.patent(level)
+    if patent is None:
+        return None
+    return patent.resize((LEADERBOARD_PATENT, LEADERBOARD_PATENT), Image.Resampling.LANCZOS)
+
+
+def _fit_text(text: str, font_size: int, max_width: int) -> str:
+    """Corta o texto com reticências até caber em max_width"""
+    if text_size(text, font_size)[0] <= max_width:
+        return text
+    while text and text_size(text + "...", font_size)[0] > max_width:
+        text = text[:-1]
+    return text + "..."
+
+
+def compose_leaderboard(title: str, rows: List[Tuple[int, str, str, Optional[int], Image.Image]],
+                        background_name: str = "background_1") -> Optional[Image.Image]:
+    """
+    Compõe a imagem do leaderboard (top N de um ranking)
+    
+    Args:
+        title: Título exibido no topo
+        rows: (posição, nome, valor, patente ou None, avatar 48x48) por jogador
+        background_name: Background do rank usado como fundo
+    
+    Returns:
+        Imagem RGBA do leaderboard, ou None se não houver background
+    """
+    background = rank_assets.background(background_name)
+    if background is None:
+        logger.error("Nenhum background disponível")
+        return None
+    
+    height = LEADERBOARD_HEADER + LEADERBOARD_ROW * len(rows) + 10
+    image = background.resize((LEADERBOARD_WIDTH, height), Image.Resampling.BILINEAR)
+    # Escurece o fundo para o texto ficar legível
+    image.alpha_composite(Image.new('RGBA', image.size, (0, 0, 0, 150)))
+    draw = ImageDraw.Draw(image)
+    
+    # Título
+    title = card_text(title)
+    x_, y_ = text_align([0, 8, LEADERBOARD_WIDTH, LEADERBOARD_HEADER - 8], title, 28)
+    draw.text(xy=(x_ + 1, y_ + 1), text=title, fill=(0, 0, 0), font=get_font(28))
+    draw.text(xy=(x_, y_), text=title, fill=(255, 215, 0), font=get_font(28))
+    
+    for idx, (position, name, value, patent, avatar) in enumerate(rows):
+        top = LEADERBOARD_HEADER + idx * LEADERBOARD_ROW
+        
+        # Posição
+        x_, y_ = text_align([4, top, 56, top + LEADERBOARD_ROW], f"#{position}", 24)
+        draw.text(xy=(x_, y_), text=f"#{position}", fill=(255, 255, 255), font=get_font(24))
+        
+        # Avatar
+        image.paste(avatar, (60, top + (LEADERBOARD_ROW - LEADERBOARD_AVATAR) // 2), avatar)
+        
+        # Patente
+        patent_img = _small_patent(patent) if patent else None
+        if patent_img is not None:
+            image.paste(patent_img, (114, top + (LEADERBOARD_ROW - LEADERBOARD_PATENT) // 2), patent_img)
+        
+        # Nome e valor
+        name = _fit_text(card_text(name), 24, LEADERBOARD_NAME_WIDTH)
+        draw.text(xy=(162, top + 8), text=name, fill=(255, 255, 255), font=get_font(24))
+        draw.text(xy=(162, top + 34), text=card_text(value), fill=(200, 200, 200), font=get_font(16))
+    
+    return image
+
+
+def render_leaderboard(title: str, rows: List[Tuple[int, str, str, Optional[int], Optional[bytes]]],
+                       background_name: str = "background_1", **encode_options) -> Optional[bytes]:
+    """
+    Decodifica os avatares, compõe o leaderboard e o codifica em memória
+    
+    rows são as mesmas de compose_leaderboard, com os bytes baixados do avatar
+    (fetch_avatar) no lugar da imagem; encode_options vão para encode_image.
+    """
+    decoded = {}
+    image_rows = []
+    for position, name, value, patent, avatar_data in rows:
+        # Avatares repetidos (ex.: avatar padrão) são decodificados uma vez
+        if avatar_data not in decoded:
+            decoded[avatar_data] = decode_avatar(avatar_data, LEADERBOARD_AVATAR, LEADERBOARD_AVATAR, False)
+        image_rows.append((position, name, value, patent, decoded[avatar_data]))
+    
+    image = compose_leaderboard(title, image_rows, background_name)
+    if image is None:
+        return None
+    return encode_image(image, **encode_options)
@@ -4,79 +4,352 @@ Sistema de rate limiting para comandos do bot
 
 import time
 import logging
-from typing import Dict, Optional
-from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from bot.core.config import Config
 
 logger = logging.getLogger(__name__)
 
+# Limites por comando, configurados em um único lugar
+# max_requests/window_seconds: limite do próprio comando
+# cost: quanto o comando consome do orçamento global do usuário
+# Comandos ausentes usam o limite padrão do RateLimiter com custo 1
+COMMAND_LIMITS: Dict[str, Dict[str, int]] = {
+    # Renderizam imagem com PIL e fazem chamadas HTTP
+    "rank": {"max_requests": 3, "window_seconds": 60, "cost": 5},
+    "top_card": {"max_requests": 3, "window_seconds": 60, "cost": 5},
+    # Buscas que varrem dados no site
+    "item_search": {"max_requests": 5, "window_seconds": 60, "cost": 2},
+    "clan": {"max_requests": 5, "window_seconds": 60, "cost": 2},
+    "boss_jewel": {"max_requests": 5, "window_seconds": 60, "cost": 2},
+    "siege_participants": {"max_requests": 5, "window_seconds": 60, "cost": 2},
+    # Comandos autenticados (chamadas com JWT)
+    "profile": {"max_requests": 5, "window_seconds": 60, "cost": 2},
+    "dashboard": {"max_requests": 5, "window_seconds": 60, "cost": 2},
+    "stats": {"max_requests": 5, "window_seconds": 60, "cost": 2},
+    # /me faz as três chamadas autenticadas de uma vez
+    "me": {"max_requests": 5, "window_seconds": 60, "cost": 4},
+}
+
+# Chave interna do orçamento global por usuário
+BUDGET_KEY = "*"
+
+
+class MongoRateLimitBackend:
+    """
+    Backend compartilhado entre shards/processos usando contadores atômicos no MongoDB
+    
+    Cada processo reserva um lote (lease) de requisições de uma vez para a janela
+    atual e consome o lote localmente, então o MongoDB só é consultado quando o
+    lote acaba ou a janela vira. Janelas esgotadas também ficam marcadas
+    localmente até o fim, sem novas consultas.
+    """
+    
+    def __init__(self, db, lease_size: int = 3):
+        """
+        Args:
+            db: Instância de Database
+            lease_size: Quantidade de requisições reservadas por consulta ao MongoDB
+        """
+        self.db = db
+        self.lease_size = max(1, lease_size)
+        # Estrutura: {(user_id, command): [janela, restantes, esgotada, window_seconds]}
+        self._leases: Dict[Tuple[int, str], List] = {}
+    
+    async def acquire(self, key: Tuple[int, str], limit: int, window_seconds: int, cost: int = 1) -> bool:
+        """Consome `cost` requisições da chave na janela atual"""
+        now = time.time()
+        window = int(now // window_seconds)
+        lease = self._leases.get(key)
+        if lease is None or lease[0] != window:
+            lease = self._leases[key] = [window, 0, False, window_seconds]
+        
+        if lease[1] >= cost:
+            lease[1] -= cost
+            return True
+        if lease[2]:
+            return False
+        
+        amount = max(cost, self.lease_size)
+        expires_at = (window + 1) * window_seconds
+        count = await self.db.rate_limit_increment(f"{key[0]}:{key[1]}:{window}", amount, expires_at)
+        granted = min(amount, limit - (count - amount))
+        lease[1] += max(0, granted)
+        
+        if lease[1] >= cost:
+            lease[1] -= cost
+            return True
+        lease[2] = True
+        return False
+    
+    def release(self, key: Tuple[int, str], cost: int = 1):
+        """Devolve ao lote local `cost` requisições consumidas na janela atual"""
+        lease = self._leases.get(key)
+        if lease is not None and lease[0] == int(time.time() // lease[3]):
+            lease[1] += cost
+    
+    def get_reset_time(self, key: Tuple[int, str]) -> Optional[float]:
+        """Fim da janela atual se a chave estiver esgotada"""
+        lease = self._leases.get(key)
+        if not lease or not lease[2]:
+            return None
+        return (lease[0] + 1) * lease[3]
+    
+    def sweep(self) -> int:
+        """Remove leases de janelas passadas"""
+        now = time.time()
+        expired = [key for key, lease in self._leases.items() if (lease[0] + 1) * lease[3] <= now]
+        for key in expired:
+            del self._leases[key]
+        return len(expired)
+    
+    def lease_count(self) -> int:
+        """Quantidade de leases em memória"""
+        return len(self._leases)
+
 
 class RateLimiter:
-    """Rate limiter por usuário e por comando"""
+    """
+    Rate limiter por usuário e por comando
+    
+    Usa GCRA (Generic Cell Rate Algorithm): cada chave guarda apenas um float,
+    o TAT (theoretical arrival time). Equivale a um token bucket de capacidade
+    max_requests que se recarrega continuamente ao longo de window_seconds.
+    
+    Além do limite de cada comando, cada usuário tem um orçamento global
+    (budget) compartilhado entre todos os comandos, consumido pelo custo
+    de cada comando.
+    """
+    
+    # Tolerância para erros de arredondamento de ponto flutuante
+    _EPSILON = 1e-6
     
-    def __init__(self, max_requests: int = 10, window_seconds: int = 60):
+    def __init__(self, max_requests: int = 10, window_seconds: int = 60,
+                 command_limits: Optional[Dict[str, Dict[str, int]]] = None,
+                 budget: int = 0, budget_window: int = 60):
         """
         Args:
-            max_requests: Número máximo de requisições
-            window_seconds: Janela de tempo em segundos
+            max_requests: Número máximo de requisições (padrão por comando)
+            window_seconds: Janela de tempo em segundos (padrão por comando)
+            command_limits: Limites e custos específicos por comando
+            budget: Orçamento global por usuário em unidades de custo (0 desativa)
+            budget_window: Janela do orçamento global em segundos
         """
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        # Estrutura: {user_id: {command: [timestamps]}}
-        self._requests: Dict[int, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
+        self.command_limits = command_limits or {}
+        self.budget = budget
+        self.budget_window = budget_window
+        # Sobrescritas por servidor: {guild_id: {command: {max_requests, window_seconds}}}
+        self._guild_overrides: Dict[int, Dict[str, Dict[str, int]]] = {}
+        # Estrutura: {user_id: {command: tat}}
+        self._requests: Dict[int, Dict[str, float]] = {}
+        # Backend compartilhado opcional (None = apenas memória do processo)
+        self.backend: Optional[MongoRateLimitBackend] = None
+    
+    def set_backend(self, backend: Optional[MongoRateLimitBackend]):
+        """Define o backend compartilhado entre processos"""
+        self.backend = backend
+    
+    def set_guild_overrides(self, guild_id: int, overrides: Optional[Dict[str, Dict[str, int]]]):
+        """Define limites específicos de um servidor (None ou vazio remove)"""
+        if overrides:
+            self._guild_overrides[guild_id] = overrides
+        else:
+            self._guild_overrides.pop(guild_id, None)
+    
+    def get_limit(self, command: str, guild_id: Optional[int] = None) -> Tuple[int, int, int]:
+        """
+        Retorna o limite efetivo de um comando
+        
+        Returns:
+            (max_requests, window_seconds, cost)
+        """
+        limit = self.command_limits.get(command, {})
+        max_requests = limit.get('max_requests', self.max_requests)
+        window_seconds = limit.get('window_seconds', self.window_seconds)
+        cost = limit.get('cost', 1)
+        
+        if guild_id is not None:
+            override = self._guild_overrides.get(guild_id, {}).get(command)
+            if override:
+                max_requests = override.get('max_requests', max_requests)
+                window_seconds = override.get('window_seconds', window_seconds)
+        
+        return max_requests, window_seconds, cost
+    
+    async def acquire(self, user_id: int, command: str, guild_id: Optional[int] = None) -> bool:
+        """
+        Versão assíncrona de is_allowed que consulta o backend compartilhado, se houver
+        
+        Em caso de erro no backend, usa o limite local do processo.
+        """
+        if self.backend is None:
+            return self.is_allowed(user_id, command, guild_id)
+        max_requests, window_seconds, cost = self.get_limit(command, guild_id)
+        try:
+            if not await self.backend.acquire((user_id, command), max_requests, window_seconds):
+                return False
+            if self.budget and not await self.backend.acquire(
+                (user_id, BUDGET_KEY), self.budget, self.budget_window, cost
+            ):
+                # Negado pelo orçamento: devolve a vaga do comando, como no caminho local
+                self.backend.release((user_id, command))
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Erro no backend de rate limit, usando limite local: {e}")
+            return self.is_allowed(user_id, command, guild_id)
+    
+    def _get_tat(self, user_id: int, command: str, now: float) -> float:
+        """Retorna o TAT da chave (nunca anterior a now), sem criar entradas"""
+        user_requests = self._requests.get(user_id)
+        if not user_requests:
+            return now
+        return max(user_requests.get(command, now), now)
     
-    def is_allowed(self, user_id: int, command: str) -> bool:
+    def is_allowed(self, user_id: int, command: str, guild_id: Optional[int] = None) -> bool:
         """
         Verifica se o usuário pode executar o comando
         
         Args:
             user_id: ID do usuário Discord
             command: Nome do comando
-            
+            guild_id: ID do servidor (para limites específicos do servidor)
+        
         Returns:
             True se permitido, False se rate limit excedido
         """
         now = time.time()
-        user_requests = self._requests[user_id][command]
+        max_requests, window_seconds, cost = self.get_limit(command, guild_id)
         
-        # Remove requisições antigas (fora da janela)
-        user_requests[:] = [ts for ts in user_requests if now - ts < self.window_seconds]
-        
-        # Verifica se excedeu o limite
-        if len(user_requests) >= self.max_requests:
+        # Limite do comando
+        new_tat = self._get_tat(user_id, command, now) + window_seconds / max_requests
+        if new_tat - now > window_seconds + self._EPSILON:
             return False
         
-        # Adiciona a requisição atual
-        user_requests.append(now)
+        # Orçamento global do usuário, consumido pelo custo do comando
+        if self.budget:
+            new_budget_tat = self._get_tat(user_id, BUDGET_KEY, now) + cost * self.budget_window / self.budget
+            if new_budget_tat - now > self.budget_window + self._EPSILON:
+                return False
+            self._requests.setdefault(user_id, {})[BUDGET_KEY] = new_budget_tat
+        
+        # Registra a requisição atual
+        self._requests.setdefault(user_id, {})[command] = new_tat
         return True
     
-    def get_remaining(self, user_id: int, command: str) -> int:
+    def get_remaining(self, user_id: int, command: str, guild_id: Optional[int] = None) -> int:
         """Retorna quantas requisições restam"""
         now = time.time()
-        user_requests = self._requests[user_id][command]
+        max_requests, window_seconds, cost = self.get_limit(command, guild_id)
+        interval = window_seconds / max_requests
+        used = self._get_tat(user_id, command, now) - now
+        remaining = int((window_seconds - used + self._EPSILON) // interval)
         
-        # Remove requisições antigas
-        user_requests[:] = [ts for ts in user_requests if now - ts < self.window_seconds]
+        if self.budget:
+            budget_interval = cost * self.budget_window / self.budget
+            budget_used = self._get_tat(user_id, BUDGET_KEY, now) - now
+            remaining = min(remaining, int((self.budget_window - budget_used + self._EPSILON) // budget_interval))
         
-        return max(0, self.max_requests - len(user_requests))
+        return max(0, remaining)
     
-    def get_reset_time(self, user_id: int, command: str) -> Optional[float]:
-        """Retorna quando o rate limit será resetado"""
-        user_requests = self._requests[user_id][command]
-        if not user_requests:
+    def get_reset_time(self, user_id: int, command: str, guild_id: Optional[int] = None) -> Optional[float]:
+        """Retorna quando a próxima requisição será permitida (None se já permitida)"""
+        if self.backend is not None:
+            reset_times = [
+                t for t in (
+                    self.backend.get_reset_time((user_id, command)),
+                    self.backend.get_reset_time((user_id, BUDGET_KEY)),
+                ) if t is not None
+            ]
+            if reset_times:
+                return max(reset_times)
+        
+        now = time.time()
+        max_requests, window_seconds, cost = self.get_limit(command, guild_id)
+        allowed_at = self._get_tat(user_id, command, now) + window_seconds / max_requests - window_seconds
+        if self.budget:
+            budget_allowed_at = (
+                self._get_tat(user_id, BUDGET_KEY, now)
+                + cost * self.budget_window / self.budget
+                - self.budget_window
+            )
+            allowed_at = max(allowed_at, budget_allowed_at)
+        
+        if allowed_at <= now + self._EPSILON:
             return None
+        return allowed_at
+    
+    def sweep(self) -> int:
+        """
+        Remove chaves ociosas (TAT no passado, ou seja, bucket cheio)
         
-        oldest = min(user_requests)
-        return oldest + self.window_seconds
+        Uma chave ociosa se comporta exatamente como uma chave inexistente,
+        então removê-la não altera nenhuma decisão futura.
+        
+        Returns:
+            Quantidade de chaves removidas
+        """
+        now = time.time()
+        removed = 0
+        for user_id in list(self._requests):
+            user_requests = self._requests[user_id]
+            for command in [c for c, tat in user_requests.items() if tat <= now]:
+                del user_requests[command]
+                removed += 1
+            if not user_requests:
+                del self._requests[user_id]
+        if self.backend is not None:
+            removed += self.backend.sweep()
+        return removed
+    
+    def entry_count(self) -> int:
+        """Quantidade de chaves (usuário, comando) em memória"""
+        return sum(len(commands) for commands in self._requests.values())
+    
+    def user_count(self) -> int:
+        """Quantidade de usuários com chaves em memória"""
+        return len(self._requests)
     
     def reset(self, user_id: int, command: Optional[str] = None):
         """Reseta o rate limit para um usuário/comando"""
         if command:
-            self._requests[user_id][command] = []
+            self._requests.get(user_id, {}).pop(command, None)
         else:
-            self._requests[user_id] = {}
+            self._requests.pop(user_id, None)
 
 
-# Instância global do rate limiter
-# 10 requisições por minuto por usuário por comando
-rate_limiter = RateLimiter(max_requests=10, window_seconds=60)
+async def check_rate_limit(interaction, command: str) -> bool:
+    """
+    Aplica o rate limit a uma interação e responde ao usuário se excedido
+    
+    Args:
+        interaction: discord.Interaction do comando
+        command: Nome do comando (chave em COMMAND_LIMITS)
+    
+    Returns:
+        True se permitido; False se excedido (a interação já foi respondida)
+    """
+    guild_id = interaction.guild.id if interaction.guild else None
+    if await rate_limiter.acquire(interaction.user.id, command, guild_id):
+        return True
+    
+    reset_time = rate_limiter.get_reset_time(interaction.user.id, command, guild_id)
+    reset_seconds = int(reset_time - time.time()) if reset_time else 60
+    await interaction.response.send_message(
+        f"⏳ Você excedeu o limite de requisições. Tente novamente em {reset_seconds} segundos.",
+        ephemeral=True
+    )
+    return False
+
 
+# Instância global do rate limiter
+# Padrão: 10 requisições por minuto por usuário por comando, com limites
+# específicos em COMMAND_LIMITS e orçamento global por usuário
+rate_limiter = RateLimiter(
+    max_requests=10,
+    window_seconds=60,
+    command_limits=COMMAND_LIMITS,
+    budget=Config.USER_RATE_BUDGET,
+    budget_window=Config.USER_RATE_BUDGET_WINDOW
+)
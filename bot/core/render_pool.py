@@ -0,0 +1,136 @@
+"""
+Pool limitado para renderização de imagens (PIL) fora do event loop
+Evita que a renderização trave as interações e o heartbeat do gateway
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict
+
+from bot.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RenderBusy(Exception):
+    """Pool de renderização cheio (ou servidor com renderizações demais na fila)"""
+    pass
+
+
+class RenderPool:
+    """
+    Executa funções de renderização em um pool de threads ou processos
+    
+    No máximo `workers` renderizações rodam ao mesmo tempo; as demais aguardam
+    em uma fila limitada. A fila é atendida em rodízio entre servidores, para
+    que um servidor com muitos pedidos não atrase os outros. Quando a fila está
+    cheia, submit levanta RenderBusy imediatamente (backpressure).
+    """
+    
+    def __init__(self, workers: int = 2, max_queue: int = 20, max_per_guild: int = 4, mode: str = 'thread'):
+        """
+        Args:
+            workers: Renderizações simultâneas
+            max_queue: Máximo de renderizações aguardando
+            max_per_guild: Máximo de renderizações (rodando + aguardando) por servidor
+            mode: 'thread' ou 'process'
+        """
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.max_per_guild = max(1, max_per_guild)
+        self.mode = mode
+        self._executor: Executor = (
+            ProcessPoolExecutor(max_workers=self.workers) if mode == 'process'
+            else ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+        )
+        # Fila por servidor, em ordem de rodízio: {guild_id: deque[future]}
+        self._queues: 'OrderedDict[Any, Deque[asyncio.Future]]' = OrderedDict()
+        self._per_guild: Dict[Any, int] = {}
+        self._queued = 0
+        self._running = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        """Renderizações aguardando um worker"""
+        return self._queued
+    
+    @property
+    def running(self) -> int:
+        """Renderizações em execução"""
+        return self._running
+    
+    def _dispatch(self):
+        """Libera as próximas renderizações da fila, em rodízio entre servidores"""
+        while self._running < self.workers and self._queues:
+            guild_id, queue = self._queues.popitem(last=False)
+            waiter = queue.popleft()
+            if queue:
+                self._queues[guild_id] = queue
+            self._queued -= 1
+            self._running += 1
+            waiter.set_result(None)
+    
+    async def submit(self, guild_id: Any, func: Callable, *args) -> Any:
+        """
+        Executa func(*args) no pool
+        
+        Args:
+            guild_id: Servidor que pediu a renderização (chave do rodízio)
+            func: Função de renderização (em modo 'process', precisa ser picklável)
+        
+        Raises:
+            RenderBusy: Se a fila (global ou do servidor) estiver cheia
+        """
+        if self._running >= self.workers and self._queued >= self.max_queue:
+            metrics.incr('render.rejected', reason='queue_full')
+            raise RenderBusy()
+        if self._per_guild.get(guild_id, 0) >= self.max_per_guild:
+            metrics.incr('render.rejected', reason='guild_limit')
+            raise RenderBusy()
+        
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._queues.setdefault(guild_id, deque()).append(waiter)
+        self._queued += 1
+        self._per_guild[guild_id] = self._per_guild.get(guild_id, 0) + 1
+        enqueued = time.perf_counter()
+        
+        try:
+            self._dispatch()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if not waiter.done() or waiter.cancelled():
+                    # Ainda na fila: remove sem ocupar um worker
+                    queue = self._queues.get(guild_id)
+                    if queue is not None and waiter in queue:
+                        queue.remove(waiter)
+                        self._queued -= 1
+                        if not queue:
+                            del self._queues[guild_id]
+                    raise
+                self._running -= 1
+                self._dispatch()
+                raise
+            
+            started = time.perf_counter()
+            metrics.observe('render.queue_ms', (started - enqueued) * 1000)
+            try:
+                return await loop.run_in_executor(self._executor, func, *args)
+            finally:
+                metrics.observe('render.ms', (time.perf_counter() - started) * 1000)
+                self._running -= 1
+                self._dispatch()
+        finally:
+            remaining = self._per_guild[guild_id] - 1
+            if remaining:
+                self._per_guild[guild_id] = remaining
+            else:
+                del self._per_guild[guild_id]
+    
+    def shutdown(self):
+        """Encerra o pool sem aguardar renderizações pendentes"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,111 @@
+"""
+Agenda dos avisos de cerco por domínio
+Mantém os próximos avisos em um min-heap, para dormir até o próximo evento
+"""
+
+import heapq
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+
+class SiegeEvent(NamedTuple):
+    """Aviso agendado: offset segundos antes do início do cerco"""
+    fire_at: float
+    domain: str
+    castle_name: str
+    siege_at: float
+    offset: int
+
+
+def parse_siege_date(value: Optional[str]) -> Optional[float]:
+    """Converte siege_date (ISO 8601) em timestamp, ou None se inválido"""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class SiegeSchedule:
+    """
+    Avisos de cerco pendentes de todos os domínios, ordenados por horário
+    
+    replace() reconstrói a agenda de um domínio a partir de get_siege_status.
+    Avisos já disparados são lembrados para não repetir quando a agenda é
+    atualizada.
+    """
+    
+    def __init__(self, offsets: Iterable[int]):
+        """
+        Args:
+            offsets: Antecedências (s) dos avisos, ex.: (86400, 3600, 0)
+        """
+        self.offsets = tuple(sorted({max(0, int(offset)) for offset in offsets}, reverse=True))
+        self._heap: List[SiegeEvent] = []
+        # Avisos já disparados: {(domínio, castelo, siege_at, offset)}
+        self._fired: Set[Tuple[str, str, float, int]] = set()
+    
+    def replace(self, domain: str, sieges: List[Dict], now: float) -> int:
+        """
+        Substitui a agenda de um domínio
+        
+        Args:
+            domain: Domínio do site
+            sieges: Lista retornada por get_siege_status
+            now: Horário atual (timestamp)
+        
+        Returns:
+            Quantidade de avisos agendados
+        """
+        self.forget(domain)
+        scheduled = 0
+        for siege in sieges:
+            if not isinstance(siege, dict):
+                continue
+            siege_at = parse_siege_date(siege.get('siege_date'))
+            if siege_at is None:
+                continue
+            castle_name = siege.get('castle_name') or 'Unknown'
+            for offset in self.offsets:
+                fire_at = siege_at - offset
+                # Avisos que já passaram não são enviados atrasados
+                if fire_at < now or (domain, castle_name, siege_at, offset) in self._fired:
+                    continue
+                heapq.heappush(self._heap, SiegeEvent(fire_at, domain, castle_name, siege_at, offset))
+                scheduled += 1
+        
+        self._prune(now)
+        return scheduled
+    
+    def forget(self, domain: str):
+        """Descarta os avisos pendentes de um domínio"""
+        self._heap = [event for event in self._heap if event.domain != domain]
+        heapq.heapify(self._heap)
+    
+    def domains(self) -> List[str]:
+        """Domínios com avisos pendentes"""
+        return list({event.domain for event in self._heap})
+    
+    def next_at(self) -> Optional[float]:
+        """Horário do próximo aviso, ou None se não houver"""
+        return self._heap[0].fire_at if self._heap else None
+    
+    def pop_due(self, now: float) -> List[SiegeEvent]:
+        """Retira e retorna os avisos com horário até now"""
+        due = []
+        while self._heap and self._heap[0].fire_at <= now:
+            event = heapq.heappop(self._heap)
+            key = (event.domain, event.castle_name, event.siege_at, event.offset)
+            if key in self._fired:
+                continue
+            self._fired.add(key)
+            due.append(event)
+        return due
+    
+    def _prune(self, now: float):
+        """Esquece avisos disparados de cercos que já começaram há mais de um dia"""
+        self._fired = {key for key in self._fired if key[2] > now - 86400}
+    
+    def __len__(self) -> int:
+        return len(self._heap)
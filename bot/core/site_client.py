@@ -2,13 +2,30 @@
 Cliente para comunicação com a API do site PDL
 """
 
+import asyncio
 import logging
+import time
 import aiohttp
+from contextvars import ContextVar
 from typing import Optional, Dict, Any, List, Union
+from bot.core.admission import TokenBucket
 from bot.core.config import Config
+from bot.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Resultado da última requisição feita na tarefa atual (usado pelo SnapshotStore)
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'              # site respondeu, mas sem dados úteis (404, 4xx, JSON inválido)
+OUTCOME_UNAVAILABLE = 'unavailable'  # circuito aberto, erro de conexão, timeout ou 5xx
+OUTCOME_BUSY = 'busy'                # rejeitada pelo controle de admissão
+_last_outcome: ContextVar[Optional[str]] = ContextVar('site_request_outcome', default=None)
+
+
+def last_request_outcome() -> Optional[str]:
+    """Resultado da última requisição ao site feita pela tarefa atual (None se nenhuma)"""
+    return _last_outcome.get()
+
 
 class SiteClient:
     """Cliente para fazer requisições à API do site"""
@@ -17,6 +34,15 @@ class SiteClient:
         self.domain = self._normalize_domain(domain)
         self.base_url = f"https://{self.domain}/api/v1"
         self.session: Optional[aiohttp.ClientSession] = None
+        # Circuit breaker: após falhas consecutivas o site fica "aberto" por um tempo
+        self._consecutive_failures = 0
+        self._circuit_open_until = 0.0
+        # Controle de admissão: taxa máxima de requisições a este domínio
+        self.admission = TokenBucket(
+            Config.UPSTREAM_RATE,
+            Config.UPSTREAM_BURST,
+            Config.UPSTREAM_MAX_QUEUE
+        )
     
     def _normalize_domain(self, domain: str) -> str:
         """Normaliza o domínio"""
@@ -37,31 +63,84 @@ class SiteClient:
             self.session = aiohttp.ClientSession(timeout=timeout)
         return self.session
     
+    @property
+    def is_available(self) -> bool:
+        """Indica se o circuito do site está fechado (site considerado online)"""
+        return time.time() >= self._circuit_open_until
+    
+    def _record_success(self):
+        """Fecha o circuito após uma resposta do site"""
+        self._consecutive_failures = 0
+        self._circuit_open_until = 0.0
+    
+    def _record_failure(self):
+        """Conta uma falha e abre o circuito ao atingir o limite"""
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= Config.CIRCUIT_FAILURE_THRESHOLD:
+            self._circuit_open_until = time.time() + Config.CIRCUIT_COOLDOWN
+            logger.warning(
+                f"Site {self.domain} indisponível, circuito aberto por {Config.CIRCUIT_COOLDOWN}s"
+            )
+    
     async def _request(self, method: str, endpoint: str, **kwargs) -> Optional[Union[Dict, List]]:
         """Faz uma requisição HTTP"""
         url = f"{self.base_url}{endpoint}"
         
+        if not self.is_available:
+            logger.debug(f"Circuito aberto para {self.domain}, ignorando {url}")
+            _last_outcome.set(OUTCOME_UNAVAILABLE)
+            return None
+        
         for attempt in range(Config.API_RETRY_ATTEMPTS):
+            if not await self.admission.acquire(Config.UPSTREAM_QUEUE_TIMEOUT):
+                metrics.incr('upstream.rejected', domain=self.domain)
+                logger.warning(f"Requisição a {self.domain} rejeitada pelo controle de admissão: {url}")
+                _last_outcome.set(OUTCOME_BUSY)
+                return None
+            
             try:
                 session = await self._get_session()
                 async with session.request(method, url, **kwargs) as response:
                     if response.status == 200:
-                        return await response.json()
+                        self._record_success()
+                        _last_outcome.set(OUTCOME_ERROR)
+                        data = await response.json()
+                        _last_outcome.set(OUTCOME_OK)
+                        return data
                     elif response.status == 404:
+                        self._record_success()
                         logger.warning(f"Endpoint não encontrado: {url}")
+                        _last_outcome.set(OUTCOME_ERROR)
                         return None
                     else:
                         logger.warning(f"Erro HTTP {response.status} em {url}")
                         if attempt < Config.API_RETRY_ATTEMPTS - 1:
                             continue
+                        if response.status >= 500:
+                            self._record_failure()
+                            _last_outcome.set(OUTCOME_UNAVAILABLE)
+                        else:
+                            _last_outcome.set(OUTCOME_ERROR)
                         return None
+            except asyncio.TimeoutError:
+                # ClientTimeout levanta TimeoutError, que não é um ClientError
+                logger.error(f"Timeout em {url}")
+                if attempt < Config.API_RETRY_ATTEMPTS - 1:
+                    continue
+                self._record_failure()
+                _last_outcome.set(OUTCOME_UNAVAILABLE)
+                return None
             except aiohttp.ClientError as e:
                 logger.error(f"Erro de conexão em {url}: {e}")
                 if attempt < Config.API_RETRY_ATTEMPTS - 1:
                     continue
+                self._record_failure()
+                _last_outcome.set(OUTCOME_UNAVAILABLE)
                 return None
             except Exception as e:
+                # Ex.: resposta que não é JSON válido
                 logger.error(f"Erro inesperado em {url}: {e}")
+                _last_outcome.set(OUTCOME_ERROR)
                 return None
         
         return None
@@ -180,6 +259,10 @@ class SiteClient:
         }
         return await self._request('POST', '/auth/login/', json=data)
     
+    async def refresh_token(self, refresh: str) -> Optional[Dict]:
+        """Renova o access token usando o refresh token"""
+        return await self._request('POST', '/auth/refresh/', json={'refresh': refresh})
+    
     async def get_user_profile(self, token: str) -> Optional[Dict]:
         """Busca perfil do usuário (requer autenticação)"""
         headers = {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,99 @@
+"""
+Último snapshot válido das respostas do site PDL
+Quando o site (ou seu circuito) está fora do ar, os comandos exibem os últimos dados conhecidos
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+from bot.core.config import Config
+from bot.core.database import Database
+from bot.core.metrics import metrics
+from bot.core.site_client import OUTCOME_BUSY, OUTCOME_UNAVAILABLE, last_request_outcome
+
+logger = logging.getLogger(__name__)
+
+Payload = Union[Dict, List]
+
+
+class Stale(NamedTuple):
+    """Dados servidos de um snapshot: quando foram obtidos e se o motivo foi sobrecarga"""
+    as_of: datetime
+    busy: bool = False
+
+
+def stale_notice(stale: Stale) -> str:
+    """Texto exibido quando os dados vêm de um snapshot"""
+    reason = "site ocupado" if stale.busy else "site indisponível"
+    return f"⚠️ Dados salvos em {stale.as_of:%d/%m/%Y %H:%M} UTC ({reason})"
+
+
+class SnapshotStore:
+    """Guarda a última resposta válida por (domínio, endpoint) no MongoDB"""
+    
+    def __init__(self, db: Database):
+        self.db = db
+        # Momento da última gravação de cada snapshot: {(domínio, endpoint): timestamp}
+        self._last_written: Dict[Tuple[str, str], float] = {}
+        self._pending_writes: Set[asyncio.Task] = set()
+    
+    def _save_later(self, domain: str, endpoint: str, data: Payload):
+        """Grava o snapshot em segundo plano, no máximo uma vez por intervalo"""
+        key = (domain, endpoint)
+        now = time.time()
+        if now - self._last_written.get(key, 0.0) < Config.SNAPSHOT_WRITE_INTERVAL:
+            return
+        self._last_written[key] = now
+        
+        task = asyncio.create_task(self.db.save_snapshot(domain, endpoint, data))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+    
+    async def fetch(self, client, endpoint: str,
+                    fetch: Callable[[], Awaitable[Optional[Payload]]]) -> Tuple[Optional[Payload], Optional[Stale]]:
+        """
+        Busca dados do site, usando o snapshot como fallback
+        
+        Se o domínio está sem capacidade (controle de admissão), serve o snapshot
+        sem consultar o site; sem snapshot, a requisição aguarda na fila. O
+        snapshot só substitui a resposta quando o site está fora (circuito
+        aberto, erro de conexão, timeout ou 5xx) ou ocupado; um 404 ou uma
+        resposta inválida não são tratados como queda.
+        
+        Args:
+            client: SiteClient do domínio
+            endpoint: Nome estável do endpoint (chave do snapshot)
+            fetch: Função que faz a requisição ao site
+        
+        Returns:
+            (dados, stale) - stale é None quando os dados vieram do site agora
+        """
+        busy = False
+        if client.is_available:
+            if not client.admission.has_capacity():
+                snapshot = await self.db.get_snapshot(client.domain, endpoint)
+                if snapshot:
+                    metrics.incr('upstream.served_from_cache', domain=client.domain)
+                    return snapshot[0], Stale(snapshot[1], busy=True)
+            
+            data = await fetch()
+            # Resposta vazia ([] ou {}) é válida; só None indica falha
+            if data is not None:
+                self._save_later(client.domain, endpoint, data)
+                return data, None
+            
+            outcome = last_request_outcome()
+            if outcome not in (OUTCOME_UNAVAILABLE, OUTCOME_BUSY, None):
+                # O site respondeu (404, resposta inválida...): não está fora do ar
+                return None, None
+            busy = outcome == OUTCOME_BUSY
+        
+        snapshot = await self.db.get_snapshot(client.domain, endpoint)
+        if not snapshot:
+            return None, None
+        
+        metrics.incr('snapshots.served', domain=client.domain, endpoint=endpoint)
+        logger.info(f"Servindo snapshot de {endpoint} para {client.domain}")
+        return snapshot[0], Stale(snapshot[1], busy=busy)
@@ -12,7 +12,13 @@ import discord
 from discord.ext import commands
 from bot.core.config import Config
 from bot.core.database import Database
+from bot.core.img_edit import avatar_cache_bytes, avatar_download_cache_bytes, close_session
 from bot.core.site_client import SiteClient
+from bot.core.auth_manager import AuthManager
+from bot.core.metrics import metrics
+from bot.core.rate_limiter import rate_limiter, MongoRateLimitBackend
+from bot.core.render_pool import RenderPool
+from bot.core.snapshots import SnapshotStore
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -50,7 +56,16 @@ class PDLBot(commands.Bot):
         
         self.config = Config()
         self.db = Database()
+        self.snapshots = SnapshotStore(self.db)  # Últimos dados válidos por domínio
+        self.auth_manager = AuthManager(self.db, self.get_site_client)  # Tokens JWT compartilhados entre os cogs
+        self.render_pool = RenderPool(  # Renderização de imagens fora do event loop
+            workers=Config.RENDER_WORKERS,
+            max_queue=Config.RENDER_MAX_QUEUE,
+            max_per_guild=Config.RENDER_MAX_PER_GUILD,
+            mode=Config.RENDER_MODE
+        )
         self.site_clients = {}  # Cache de clientes por domínio
+        self._background_tasks = []
         
     async def setup_hook(self):
         """Configuração inicial do bot"""
@@ -60,6 +75,19 @@ class PDLBot(commands.Bot):
         await self.db.connect()
         logger.info("Conectado ao MongoDB")
         
+        # Rate limit compartilhado entre shards/processos
+        if Config.RATE_LIMIT_BACKEND == 'mongo':
+            backend = MongoRateLimitBackend(self.db, Config.RATE_LIMIT_LEASE_SIZE)
+            rate_limiter.set_backend(backend)
+            metrics.register_gauge('rate_limiter.leases', backend.lease_count)
+            logger.info("Rate limit compartilhado via MongoDB")
+        
+        # Limites de rate limit específicos de cada servidor
+        for server in await self.db.list_servers():
+            overrides = (server.get('config') or {}).get('rate_limits')
+            if overrides:
+                rate_limiter.set_guild_overrides(int(server['discord_guild_id']), overrides)
+        
         # Carregar cogs
         try:
             # Cogs principais
@@ -90,6 +118,43 @@ class PDLBot(commands.Bot):
         
         logger.info("Cogs carregados")
         
+        # Limpeza periódica de estado ocioso
+        metrics.register_gauge('rate_limiter.entries', rate_limiter.entry_count)
+        metrics.register_gauge('rate_limiter.users', rate_limiter.user_count)
+        metrics.register_gauge('auth.token_cache_entries', self.auth_manager.cache_size)
+        metrics.register_gauge('render.queue_depth', lambda: self.render_pool.queue_depth)
+        metrics.register_gauge('render.running', lambda: self.render_pool.running)
+        metrics.register_gauge('avatar.cache_bytes', avatar_cache_bytes)
+        metrics.register_gauge('avatar.download_cache_bytes', avatar_download_cache_bytes)
+        self._background_tasks.append(asyncio.create_task(self._sweep_loop()))
+        
+        # Resumo periódico das métricas
+        if Config.METRICS_LOG_INTERVAL > 0:
+            self._background_tasks.append(asyncio.create_task(self._metrics_loop()))
+    
+    async def _sweep_loop(self):
+        """Remove periodicamente chaves ociosas do rate limiter e tokens expirados"""
+        while not self.is_closed():
+            await asyncio.sleep(Config.SWEEP_INTERVAL)
+            try:
+                removed = rate_limiter.sweep()
+                if removed:
+                    logger.debug(f"Rate limiter: {removed} chave(s) ociosa(s) removida(s)")
+                removed = self.auth_manager.sweep_expired()
+                if removed:
+                    logger.debug(f"{removed} token(s) expirado(s) removido(s)")
+            except Exception as e:
+                logger.error(f"Erro na limpeza de estado ocioso: {e}")
+    
+    async def _metrics_loop(self):
+        """Escreve periodicamente o resumo das métricas no log"""
+        while not self.is_closed():
+            await asyncio.sleep(Config.METRICS_LOG_INTERVAL)
+            try:
+                metrics.log_summary()
+            except Exception as e:
+                logger.error(f"Erro ao registrar métricas: {e}")
+        
     async def on_ready(self):
         """Evento quando o bot está pronto"""
         logger.info('=' * 50)
@@ -144,8 +209,14 @@ class PDLBot(commands.Bot):
     
     async def get_site_client(self, domain: str) -> SiteClient:
         """Obtém ou cria um cliente para um domínio específico"""
+        # Mesmo domínio escrito de outra forma (www., https://) usa o mesmo cliente e limite
+        domain = self.db._normalize_domain(domain)
         if domain not in self.site_clients:
-            self.site_clients[domain] = SiteClient(domain)
+            client = SiteClient(domain)
+            self.site_clients[domain] = client
+            metrics.register_gauge(
+                'upstream.waiting', lambda: client.admission.waiting, domain=client.domain
+            )
         
         return self.site_clients[domain]
     
@@ -205,6 +276,10 @@ class PDLBot(commands.Bot):
     
     async def close(self):
         """Fechar conexões ao desligar"""
+        for task in self._background_tasks:
+            task.cancel()
+        self.render_pool.shutdown()
+        await close_session()
         await self.db.close()
         await super().close()
 